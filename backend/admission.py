@@ -0,0 +1,216 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import math
+import os
+import time
+from contextvars import ContextVar
+
+# Rate limit for model calls: a token bucket refilled at LLM_RATE_LIMIT calls per
+# second that holds at most LLM_BURST tokens (0 disables the limit)
+RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "5"))
+BURST = int(os.getenv("LLM_BURST", "10"))
+# Calls allowed to wait for admission at once; beyond this the lowest priority is shed
+MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))
+
+# Lower rank is served first. Interactive calls are the ones a user is waiting on;
+# queued jobs come next and the nightly pre-generation batch last.
+PRIORITIES = {"interactive": 0, "job": 1, "background": 2}
+# Longest a call may wait for admission before it is shed, per priority
+MAX_QUEUE_WAIT = {
+    "interactive": float(os.getenv("LLM_MAX_QUEUE_WAIT", "10")),
+    "job": float(os.getenv("LLM_JOB_MAX_QUEUE_WAIT", "60")),
+    "background": float(os.getenv("LLM_BACKGROUND_MAX_QUEUE_WAIT", "300")),
+}
+
+WAIT_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+DEPTH_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200]
+
+# Priority of the model calls made from the current task. Request handlers run with
+# the default; background tasks set their own once at the top of the task.
+llm_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+class LLMOverloadedError(Exception):
+    # 429 when the rate limit would keep the call waiting too long, 503 when the
+    # queue is full or the call waited its maximum without being admitted
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class Histogram:
+    def __init__(self, buckets: list):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def stats(self) -> dict:
+        # Cumulative counts per upper bound, as in a Prometheus histogram
+        cumulative = list(itertools.accumulate(self.counts))
+        return {
+            "buckets": {**{f"le_{bound}": count for bound, count in zip(self.buckets, cumulative)}, "le_inf": self.total},
+            "count": self.total,
+            "sum": round(self.sum, 4)
+        }
+
+# Admits model calls in priority order when both a rate token and a concurrency slot
+# are free. Calls that cannot be admitted in time are refused up front: when the
+# bucket's refill rate says the wait would exceed the priority's maximum (429), or
+# when the queue is full and nothing of lower priority can be evicted (503).
+class AdmissionController:
+    def __init__(self, rate: float, burst: int, max_concurrency: int, max_queue: int, max_wait: dict):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self._refilled_at = time.monotonic()
+        self._queue = []
+        self._seq = itertools.count()
+        self._timer = None
+        self.admitted = {priority: 0 for priority in PRIORITIES}
+        self.shed = {priority: {"rate_limited": 0, "queue_full": 0, "timed_out": 0} for priority in PRIORITIES}
+        self.wait_time = {priority: Histogram(WAIT_BUCKETS) for priority in PRIORITIES}
+        self.queue_depth = Histogram(DEPTH_BUCKETS)
+
+    def _refill(self):
+        if self.rate <= 0:
+            self.tokens = float(self.burst)
+            return
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _can_admit(self) -> bool:
+        return self.in_flight < self.max_concurrency and (self.rate <= 0 or self.tokens >= 1)
+
+    def _take(self):
+        self.tokens -= 1
+        self.in_flight += 1
+
+    def _waiting(self) -> list:
+        return [entry for entry in self._queue if not entry[2].done()]
+
+    def _shed(self, priority: str, reason: str, message: str, status_code: int, retry_after: float) -> LLMOverloadedError:
+        self.shed[priority][reason] += 1
+        return LLMOverloadedError(message, status_code, retry_after)
+
+    def _dispatch(self):
+        self._timer = None
+        self._refill()
+        while self._queue and self._can_admit():
+            _, _, future, _ = heapq.heappop(self._queue)
+            if future.done():
+                # Timed out or cancelled while queued
+                continue
+            self._take()
+            future.set_result(None)
+        while self._queue and self._queue[0][2].done():
+            heapq.heappop(self._queue)
+        if self._queue and self.in_flight < self.max_concurrency and self.rate > 0:
+            # Only the rate limit is holding the queue back: wake up when the next token is in
+            self._timer = asyncio.get_running_loop().call_later((1 - self.tokens) / self.rate, self._dispatch)
+
+    def _evict_lowest(self, rank: int) -> bool:
+        # Makes room for a call by shedding the newest waiter of the lowest priority
+        # below it, if there is one
+        waiting = self._waiting()
+        if not waiting:
+            return False
+        victim = max(waiting, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= rank:
+            return False
+        victim_priority = victim[3]
+        victim[2].set_exception(self._shed(
+            victim_priority, "queue_full", "Model queue is full", 503, self.max_wait[victim_priority]
+        ))
+        return True
+
+    def _check_rate(self, priority: str, waiting: list):
+        if self.rate <= 0:
+            return
+        rank = PRIORITIES[priority]
+        ahead = sum(1 for entry in waiting if entry[0] <= rank)
+        expected_wait = max(0.0, ahead + 1 - self.tokens) / self.rate
+        if expected_wait > self.max_wait[priority]:
+            raise self._shed(
+                priority, "rate_limited",
+                f"Model rate limit reached, expected wait {expected_wait:.1f}s", 429, expected_wait
+            )
+
+    def check(self, priority: str):
+        # Raises the error acquire would refuse a call with right now, without queuing
+        # or evicting anything. Lets streaming endpoints answer 429/503 with a status
+        # code before their response has started.
+        self._refill()
+        waiting = self._waiting()
+        if not waiting and self._can_admit():
+            return
+        if len(waiting) >= self.max_queue and all(entry[0] <= PRIORITIES[priority] for entry in waiting):
+            raise self._shed(priority, "queue_full", "Model queue is full", 503, self.max_wait[priority])
+        self._check_rate(priority, waiting)
+
+    async def acquire(self, priority: str):
+        rank = PRIORITIES[priority]
+        max_wait = self.max_wait[priority]
+        queued_at = time.monotonic()
+        self._refill()
+        waiting = self._waiting()
+        self.queue_depth.observe(len(waiting))
+        if not waiting and self._can_admit():
+            self._take()
+            self.admitted[priority] += 1
+            self.wait_time[priority].observe(0.0)
+            return
+
+        if len(waiting) >= self.max_queue and not self._evict_lowest(rank):
+            raise self._shed(priority, "queue_full", "Model queue is full", 503, max_wait)
+        self._check_rate(priority, waiting)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (rank, next(self._seq), future, priority))
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+            raise self._shed(priority, "timed_out", f"Model call not admitted within {max_wait}s", 503, max_wait)
+        except asyncio.CancelledError:
+            # Cancelled right after being admitted: hand the slot back
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            raise
+        self.admitted[priority] += 1
+        self.wait_time[priority].observe(time.monotonic() - queued_at)
+
+    def release(self):
+        self.in_flight -= 1
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    def stats(self) -> dict:
+        self._refill()
+        waiting = self._waiting()
+        return {
+            "rate_limit_per_s": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "in_flight": self.in_flight,
+            "queued": {priority: sum(1 for entry in waiting if entry[3] == priority) for priority in PRIORITIES},
+            "max_queue": self.max_queue,
+            "max_queue_wait_s": self.max_wait,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "queue_depth": self.queue_depth.stats(),
+            "wait_time_s": {priority: histogram.stats() for priority, histogram in self.wait_time.items()}
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+from db import checkout
+from db_ops import save_conversations
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+# A partial batch is flushed once its oldest entry has waited this long
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+# When the queue is full a request waits at most this long for room before its entry is dropped
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.05"))
+
+_STOP = object()
+
+# Conversations log writer. Endpoints hand entries to a bounded in-process queue and
+# return; a background task writes them in batches on a size or time trigger. A full
+# queue pushes back on callers briefly, then drops entries rather than slowing requests.
+# Entries still queued at shutdown are flushed by stop().
+class AuditWriter:
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float, enqueue_timeout: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._task = None
+        self.enqueued_total = 0
+        self.written_total = 0
+        self.overflows_total = 0
+        self.dropped_total = 0
+        self.failed_total = 0
+        self.batches_total = 0
+        self.flush_time_max = 0.0
+
+    async def record(self, user_id: Optional[int], action: str, data: dict, workout_id: Optional[int] = None):
+        entry = (user_id, action, data, workout_id)
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.overflows_total += 1
+            try:
+                await asyncio.wait_for(self._queue.put(entry), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped_total += 1
+                logger.warning(f"Audit queue full, dropped '{action}' entry for user_id: {user_id}")
+                return
+        self.enqueued_total += 1
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # The sentinel ends the writer after everything queued before it is written
+        if self._task:
+            await self._queue.put(_STOP)
+            await self._task
+            self._task = None
+        # Entries recorded while the writer was stopping
+        while not self._queue.empty():
+            await self._flush(self._take_batch(self.batch_size))
+
+    def _take_batch(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is _STOP:
+                continue
+            batch.append(entry)
+        return batch
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            entry = await self._queue.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        if not batch:
+            return
+        started = time.monotonic()
+        try:
+            async with checkout(owner="audit writer") as db:
+                await save_conversations(batch, db)
+            self.written_total += len(batch)
+            self.batches_total += 1
+        except Exception as e:
+            self.failed_total += len(batch)
+            logger.error(f"Failed to write {len(batch)} audit entries: {str(e)}")
+        self.flush_time_max = max(self.flush_time_max, time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+            "enqueued_total": self.enqueued_total,
+            "written_total": self.written_total,
+            "batches_total": self.batches_total,
+            "overflows_total": self.overflows_total,
+            "dropped_total": self.dropped_total,
+            "failed_total": self.failed_total,
+            "avg_batch_size": round(self.written_total / self.batches_total, 1) if self.batches_total else 0.0,
+            "flush_time_max_ms": round(1000 * self.flush_time_max, 2)
+        }
+
+audit_writer = AuditWriter(AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_ENQUEUE_TIMEOUT)
@@ -0,0 +1,77 @@
+# Encode/decode time of realistic 7-day workout and nutrition payloads with the
+# standard library json module against the configured fast codec. Run from backend/:
+#     python benchmarks/bench_json.py
+import json
+import os
+import sys
+import time
+from typing import Callable
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from json_codec import JSON_CODEC, dumps, loads, FastJSONResponse
+from main import DAYS_OF_WEEK
+
+ROUNDS = 2000
+
+def _workout_week() -> list:
+    return [
+        {
+            "day": day,
+            "exercises": [
+                {"name": f"Barbell Exercise {i}", "sets": 4, "reps": "AMRAP" if i == 5 else 8 + i, "weight": f"{40 + 5 * i}kg"}
+                for i in range(6)
+            ]
+        }
+        for day in DAYS_OF_WEEK
+    ]
+
+def _nutrition_week() -> list:
+    return [
+        {
+            "day": day,
+            "meals": [
+                {
+                    "meal_id": 100 * d + m, "name": f"Meal {m} with grilled chicken, rice and vegetables",
+                    "meal_type": meal_type, "calories": 612.37, "protein_g": 41.25, "carbs_g": 58.8,
+                    "fat_g": 19.04, "portion_size_multiplier": 1.12
+                }
+                for m, meal_type in enumerate(["breakfast", "lunch", "dinner", "snack"])
+            ]
+        }
+        for d, day in enumerate(DAYS_OF_WEEK)
+    ]
+
+def _numpy_nutrition_week() -> list:
+    # As the meal optimizer could produce it: numpy scalars in the meal values
+    return [
+        {"day": day["day"], "meals": [{key: np.float64(value) if isinstance(value, float) else value for key, value in meal.items()} for meal in day["meals"]]}
+        for day in _nutrition_week()
+    ]
+
+def _timed(fn: Callable, arg) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(arg)
+    return 1e6 * (time.perf_counter() - started) / ROUNDS
+
+def _report(label: str, baseline: float, fast: float):
+    print(f"  {label:<18} json {baseline:7.1f} us   {JSON_CODEC} {fast:7.1f} us   ({baseline / fast:.1f}x)")
+
+def main():
+    # Anything the codec encodes must come back as plain JSON values
+    assert loads(dumps(_numpy_nutrition_week())) == _nutrition_week()
+    for name, payload in (("7-day workout", _workout_week()), ("7-day nutrition", _nutrition_week())):
+        encoded = json.dumps(payload).encode()
+        assert loads(dumps(payload)) == payload
+        print(f"{name} ({len(encoded)} bytes):")
+        # Jsonb(...) parameter and JSONB column round trip through psycopg
+        _report("encode (Jsonb)", _timed(json.dumps, payload), _timed(dumps, payload))
+        _report("decode (JSONB)", _timed(json.loads, encoded), _timed(loads, encoded))
+        # Response body rendering
+        _report("response render", _timed(JSONResponse(None).render, payload), _timed(FastJSONResponse(None).render, payload))
+
+if __name__ == "__main__":
+    main()
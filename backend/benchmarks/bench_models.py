@@ -0,0 +1,73 @@
+# Memory per 10k exercises and /workouts/week/ serialization time, before and after
+# the slotted models and the JSONB passthrough. Run from backend/:
+#     python benchmarks/bench_models.py
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from main import _week_json, DAYS_OF_WEEK
+from models import Exercise
+from schemas import DailyWorkoutSchema
+
+EXERCISES = 10_000
+WEEKS = 200
+
+# The model class as it was before __slots__
+class DictExercise:
+    def __init__(self, name: str, sets: int, reps, weight: Optional[str] = "N/A"):
+        self.name = name
+        self.sets = sets
+        self.reps = reps
+        self.weight = weight
+
+def _exercise_rows(count: int) -> List[dict]:
+    return [
+        {"name": f"Exercise {i % 40}", "sets": 3 + i % 3, "reps": "AMRAP" if i % 7 == 0 else 8 + i % 5, "weight": f"{20 + i % 60}kg"}
+        for i in range(count)
+    ]
+
+def _memory(cls, rows: List[dict]) -> int:
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    objects = [cls(**row) for row in rows]
+    used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, "filename"))
+    tracemalloc.stop()
+    del objects
+    return used
+
+def _old_week_response(rows: List[tuple]) -> bytes:
+    # JSONB decoded by the driver, Exercise and DailyWorkoutSchema built, then FastAPI's
+    # response_model validation and jsonable_encoder before json.dumps
+    weekly = [
+        DailyWorkoutSchema(day=day, exercises=[DictExercise(**ex) for ex in exercises])
+        for day, exercises in rows
+    ]
+    validated = [DailyWorkoutSchema.model_validate(workout, from_attributes=True) for workout in weekly]
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+def _timed(fn, weeks: list) -> float:
+    started = time.perf_counter()
+    for rows in weeks:
+        fn(rows)
+    return (time.perf_counter() - started) / len(weeks)
+
+def main():
+    rows = _exercise_rows(EXERCISES)
+    before, after = _memory(DictExercise, rows), _memory(Exercise, rows)
+    print(f"Memory for {EXERCISES} exercises: {before / 1024:.0f} KiB before, {after / 1024:.0f} KiB after ({after / before:.0%})")
+
+    week = [(day, _exercise_rows(6)) for day in DAYS_OF_WEEK]
+    decoded_weeks = [week] * WEEKS
+    text_weeks = [[(day, json.dumps(exercises)) for day, exercises in week]] * WEEKS
+    assert json.loads(_old_week_response(week)) == json.loads(_week_json(text_weeks[0]))
+    before, after = _timed(_old_week_response, decoded_weeks), _timed(_week_json, text_weeks)
+    print(f"/workouts/week/ body for 7 days x 6 exercises: {1e6 * before:.0f} us before, {1e6 * after:.0f} us after ({before / after:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
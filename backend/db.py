@@ -1,38 +1,176 @@
-import psycopg2
-from psycopg2 import pool
+import asyncio
+import itertools
+import logging
 import os
+import time
+import traceback
+from contextlib import asynccontextmanager
+from fastapi import Request
+from psycopg import pq
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
 from dotenv import load_dotenv
+from json_codec import register_json_codec
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize a connection pool from environment variables
-connection_pool = psycopg2.pool.SimpleConnectionPool(
-    1, 20,
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT"),
-    database=os.getenv("DB_NAME")
+logger = logging.getLogger(__name__)
+
+# Seconds a caller may wait for a free connection before PoolTimeout is raised
+CHECKOUT_TIMEOUT = float(os.getenv("DB_CHECKOUT_TIMEOUT", "10"))
+# Connections held longer than this are reported as possible leaks
+LEAK_THRESHOLD = float(os.getenv("DB_LEAK_THRESHOLD", "30"))
+LEAK_CHECK_INTERVAL = float(os.getenv("DB_LEAK_CHECK_INTERVAL", "10"))
+
+async def _configure_connection(conn):
+    register_json_codec(conn)
+
+# Initialize an async connection pool from environment variables.
+# The pool is opened/closed by the FastAPI lifespan in main.py. Connections are in
+# autocommit mode; multi-statement writes group themselves with atomic() below.
+connection_pool = AsyncConnectionPool(
+    make_conninfo(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        dbname=os.getenv("DB_NAME")
+    ),
+    min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    max_size=int(os.getenv("DB_POOL_MAX_SIZE", "20")),
+    timeout=CHECKOUT_TIMEOUT,
+    kwargs={"autocommit": True},
+    configure=_configure_connection,
+    open=False
 )
 
-def get_db_connection():
-    try:
-        conn = connection_pool.getconn()
-        if conn:
-            return conn
-    except Exception as e:
-        print(f"Error connecting to database: {e}")
-        raise
-
-def close_db_connection(conn):
-    if conn:
-        connection_pool.putconn(conn)
-
-# FastAPI dependency to yield a connection
-async def get_db():
-    conn = get_db_connection()
+class Checkout:
+    def __init__(self, checkout_id: int, owner: str, stack: str):
+        self.checkout_id = checkout_id
+        self.owner = owner
+        self.stack = stack
+        self.acquired_at = time.monotonic()
+        self.reported = False
+
+    def held_for(self) -> float:
+        return time.monotonic() - self.acquired_at
+
+# Tracks who holds pool connections, how long they waited for them and how long they keep them
+class PoolMonitor:
+    def __init__(self, leak_threshold: float):
+        self.leak_threshold = leak_threshold
+        self.active = {}
+        self.waiting = 0
+        self.checkouts_total = 0
+        self.failures_total = 0
+        self.leaks_reported = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self._ids = itertools.count(1)
+
+    def start_wait(self):
+        self.waiting += 1
+        return time.monotonic()
+
+    def end_wait(self, started: float, acquired: bool):
+        self.waiting -= 1
+        waited = time.monotonic() - started
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        if not acquired:
+            self.failures_total += 1
+
+    def acquired(self, owner: str, stack: str) -> Checkout:
+        checkout = Checkout(next(self._ids), owner, stack)
+        self.active[checkout.checkout_id] = checkout
+        self.checkouts_total += 1
+        return checkout
+
+    def released(self, checkout: Checkout):
+        self.active.pop(checkout.checkout_id, None)
+        if checkout.reported:
+            logger.warning(f"Connection checkout #{checkout.checkout_id} ({checkout.owner}) returned after {checkout.held_for():.1f}s")
+
+    def report_leaks(self):
+        for checkout in list(self.active.values()):
+            if checkout.reported or checkout.held_for() < self.leak_threshold:
+                continue
+            checkout.reported = True
+            self.leaks_reported += 1
+            logger.warning(
+                f"Connection checkout #{checkout.checkout_id} ({checkout.owner}) held for "
+                f"{checkout.held_for():.1f}s, possible leak. Checked out at:\n{checkout.stack}"
+            )
+
+    def stats(self) -> dict:
+        pool_stats = connection_pool.get_stats()
+        held = [c.held_for() for c in self.active.values()]
+        return {
+            "pool_size": pool_stats.get("pool_size", 0),
+            "pool_max": connection_pool.max_size,
+            "in_use": len(self.active),
+            "idle": pool_stats.get("pool_available", 0),
+            "waiters": self.waiting,
+            "checkouts_total": self.checkouts_total,
+            "checkout_failures_total": self.failures_total,
+            "wait_time_avg_ms": round(1000 * self.wait_time_total / self.checkouts_total, 2) if self.checkouts_total else 0.0,
+            "wait_time_max_ms": round(1000 * self.wait_time_max, 2),
+            "longest_held_s": round(max(held), 2) if held else 0.0,
+            "leaks_reported_total": self.leaks_reported,
+            "connections_lost": pool_stats.get("connections_lost", 0)
+        }
+
+pool_monitor = PoolMonitor(LEAK_THRESHOLD)
+_leak_watcher = None
+
+async def _watch_for_leaks():
+    while True:
+        await asyncio.sleep(LEAK_CHECK_INTERVAL)
+        pool_monitor.report_leaks()
+
+async def open_pool():
+    global _leak_watcher
+    await connection_pool.open()
+    _leak_watcher = asyncio.create_task(_watch_for_leaks())
+
+async def close_pool():
+    if _leak_watcher:
+        _leak_watcher.cancel()
+    await connection_pool.close()
+
+@asynccontextmanager
+async def checkout(owner: str = "unknown", timeout: float = CHECKOUT_TIMEOUT):
+    # Every connection leaves the pool through here so it is always returned and accounted for
+    stack = "".join(traceback.format_stack(limit=12)[:-2])
+    started = pool_monitor.start_wait()
+    acquired = False
     try:
-        yield conn
+        async with connection_pool.connection(timeout=timeout) as conn:
+            acquired = True
+            pool_monitor.end_wait(started, acquired=True)
+            record = pool_monitor.acquired(owner, stack)
+            try:
+                yield conn
+            finally:
+                pool_monitor.released(record)
     finally:
-        close_db_connection(conn)
\ No newline at end of file
+        if not acquired:
+            pool_monitor.end_wait(started, acquired=False)
+
+# FastAPI dependency scoped to the request; the connection is returned to the pool when the request ends
+async def get_db_connection(request: Request):
+    async with checkout(owner=f"{request.method} {request.url.path}") as conn:
+        yield conn
+
+get_db = get_db_connection
+
+@asynccontextmanager
+async def atomic(db):
+    # Unit of work: the outermost block runs in one transaction that commits once on
+    # exit and rolls back on error. Nested blocks and the db_ops calls inside join it.
+    if db.info.transaction_status != pq.TransactionStatus.IDLE:
+        yield db
+        return
+    async with db.transaction():
+        yield db
@@ -1,14 +1,46 @@
-from models import UserFitnessInput, DailyWorkout, DailyWorkoutFeedback, GymStrength, HomeStrength, Exercise, ExerciseFeedback
-from psycopg2.extras import Json
-import json
-import psycopg2.extras
+from models import UserFitnessInput, DailyWorkout, DailyWorkoutFeedback, GymStrength, HomeStrength, Exercise, ExerciseFeedback, NextWorkoutContext, NextWeekContext
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from psycopg.rows import dict_row
+from db import atomic
+from profile_cache import get_cached_user, cache_user, invalidate_user
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Sequence, Tuple
+
+# Connections run in autocommit mode (see db.py): a write here commits on its own,
+# or joins the caller's transaction when it runs inside atomic(db).
+
+# Batches at least this large are written with COPY instead of a pipelined executemany
+COPY_THRESHOLD = 500
+
+async def insert_rows(cursor, table: str, columns: Sequence[str], rows: List[tuple]):
+    # Bulk insert without RETURNING, in a single round trip either way
+    if not rows:
+        return
+    if len(rows) >= COPY_THRESHOLD:
+        copy_sql = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(table.lower()), sql.SQL(", ").join(map(sql.Identifier, columns))
+        )
+        async with cursor.copy(copy_sql) as copy:
+            for row in rows:
+                await copy.write_row(row)
+        return
+    insert_sql = sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+        sql.Identifier(table.lower()),
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
+        sql.SQL(", ").join(sql.Placeholder() * len(columns))
+    )
+    await cursor.executemany(insert_sql, rows)
+
+def _values_list(row_count: int, width: int) -> sql.Composable:
+    # "(%s, %s), (%s, %s), ..." for a multi-row INSERT ... VALUES
+    row = sql.SQL("({})").format(sql.SQL(", ").join(sql.Placeholder() * width))
+    return sql.SQL(", ").join([row] * row_count)
 
 async def save_user(user_input: UserFitnessInput, db) -> int:
     try:
         cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             INSERT INTO Users (
                 name, age, height_cm, weight_kg, fat_percentage, experience_level, 
@@ -24,24 +56,27 @@ async def save_user(user_input: UserFitnessInput, db) -> int:
                 user_input.weight_kg,
                 user_input.fat_percentage,
                 user_input.experience_level,
-                Json(user_input.equipment or []),  # Ensure empty list if None
+                Jsonb(user_input.equipment or []),  # Ensure empty list if None
                 user_input.fitness_goal,
                 user_input.gender,
-                Json(user_input.gym_strength.dict() if user_input.gym_strength else None),
-                Json(user_input.home_strength.dict() if user_input.home_strength else None)
+                Jsonb(user_input.gym_strength.dict() if user_input.gym_strength else None),
+                Jsonb(user_input.home_strength.dict() if user_input.home_strength else None)
             )
         )
-        user_id = cursor.fetchone()[0]
-        db.commit()
+        user_id = (await cursor.fetchone())[0]
+        # Any path that writes to Users must drop the cached profile
+        invalidate_user(user_id)
         return user_id
     except Exception as e:
-        db.rollback()
         raise Exception(f"Failed to save user specifications to database: {e}")
 
 async def load_user(user_id: int, db) -> UserFitnessInput:
+    cached = get_cached_user(user_id)
+    if cached is not None:
+        return cached
     try:
         cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT name, age, height_cm, weight_kg, fat_percentage, experience_level, 
                    equipment, fitness_goal, gender, gym_strength, home_strength
@@ -50,10 +85,10 @@ async def load_user(user_id: int, db) -> UserFitnessInput:
             """,
             (user_id,)
         )
-        user_data = cursor.fetchone()
+        user_data = await cursor.fetchone()
         if not user_data:
             raise ValueError("User not found in database")
-        return UserFitnessInput(
+        user_input = UserFitnessInput(
             name=user_data[0],
             age=user_data[1],
             height_cm=user_data[2],
@@ -66,31 +101,113 @@ async def load_user(user_id: int, db) -> UserFitnessInput:
             gym_strength=GymStrength(**user_data[9]) if user_data[9] else None,
             home_strength=HomeStrength(**user_data[10]) if user_data[10] else None
         )
+        cache_user(user_id, user_input)
+        return user_input
     except Exception as e:
         raise Exception(f"Failed to load user specifications: {e}")
 
 async def save_workout(user_id: int, workout: DailyWorkout, db) -> int:
     try:
         cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             INSERT INTO Workouts (user_id, day, exercises)
             VALUES (%s, %s, %s)
             RETURNING workout_id
             """,
-            (user_id, workout.day, Json([ex.dict() for ex in workout.exercises]))
+            (user_id, workout.day, Jsonb([ex.dict() for ex in workout.exercises]))
         )
-        workout_id = cursor.fetchone()[0]
-        db.commit()
+        workout_id = (await cursor.fetchone())[0]
         return workout_id
     except Exception as e:
-        db.rollback()
         raise Exception(f"Failed to save workout to database: {e}")
 
+async def save_workouts(user_id: int, workouts: List[DailyWorkout], db) -> List[int]:
+    # One multi-row INSERT for a whole week; ids come back in input order
+    if not workouts:
+        return []
+    try:
+        cursor = db.cursor()
+        params = []
+        for position, workout in enumerate(workouts):
+            params.extend([position, user_id, workout.day, Jsonb([ex.dict() for ex in workout.exercises])])
+        await cursor.execute(
+            sql.SQL(
+                """
+                WITH new_rows (position, user_id, day, exercises) AS (VALUES {})
+                INSERT INTO Workouts (user_id, day, exercises)
+                SELECT user_id, day, exercises FROM new_rows ORDER BY position
+                RETURNING workout_id
+                """
+            ).format(_values_list(len(workouts), 4)),
+            params
+        )
+        # workout_id is a serial, so ascending ids follow the ORDER BY above
+        workout_ids = sorted(row[0] for row in await cursor.fetchall())
+        return workout_ids
+    except Exception as e:
+        raise Exception(f"Failed to save workouts to database: {e}")
+
+async def load_recent_workouts(user_id: int, db, days: int = 7) -> List[DailyWorkout]:
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            SELECT day, exercises
+            FROM Workouts
+            WHERE user_id = %s
+            AND created_at >= %s - %s * INTERVAL '1 day'
+            ORDER BY created_at DESC
+            """,
+            (user_id, datetime.now(), days)
+        )
+        return [
+            DailyWorkout(day=row[0], exercises=[Exercise(**ex) for ex in row[1]])
+            for row in await cursor.fetchall()
+        ]
+    except Exception as e:
+        raise Exception(f"Failed to load recent workouts: {e}")
+
+async def resolve_workout_ids(user_id: int, days: List[str], now: datetime, db) -> dict:
+    # Latest workout_id per day in the current week, for all the given days at once
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            SELECT DISTINCT ON (day) day, workout_id
+            FROM Workouts
+            WHERE user_id = %s
+            AND day = ANY(%s)
+            AND created_at >= %s - INTERVAL '7 days'
+            ORDER BY day, created_at DESC
+            """,
+            (user_id, list(days), now)
+        )
+        return {day: workout_id for day, workout_id in await cursor.fetchall()}
+    except Exception as e:
+        raise Exception(f"Failed to resolve workout ids: {e}")
+
+async def load_workout_week_version(user_id: int, now: datetime, db) -> tuple:
+    # Row count and newest xmin of the current week's workouts; never touches exercises
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            SELECT COUNT(*), COALESCE(MAX(xmin::text::bigint), 0)
+            FROM Workouts
+            WHERE user_id = %s
+            AND created_at >= %s - INTERVAL '7 days'
+            """,
+            (user_id, now)
+        )
+        return tuple(await cursor.fetchone())
+    except Exception as e:
+        raise Exception(f"Failed to load weekly workout version: {e}")
+
 async def load_previous_workout(user_id: int, target_day: str, db) -> DailyWorkout:
     try:
         cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT day, exercises
             FROM Workouts
@@ -103,7 +220,7 @@ async def load_previous_workout(user_id: int, target_day: str, db) -> DailyWorko
             """,
             (user_id, target_day, datetime.now(), datetime.now())
         )
-        workout_data = cursor.fetchone()
+        workout_data = await cursor.fetchone()
         if not workout_data:
             raise ValueError(f"No previous workout found for {target_day} from the previous week")
         exercises = [
@@ -114,10 +231,31 @@ async def load_previous_workout(user_id: int, target_day: str, db) -> DailyWorko
     except Exception as e:
         raise Exception(f"Failed to load previous workout: {e}")
 
+async def load_previous_week(user_id: int, db) -> List[DailyWorkout]:
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            SELECT day, exercises
+            FROM Workouts
+            WHERE user_id = %s
+            AND created_at >= %s - INTERVAL '14 days'
+            AND created_at < %s - INTERVAL '7 days'
+            ORDER BY created_at DESC
+            """,
+            (user_id, datetime.now(), datetime.now())
+        )
+        return [
+            DailyWorkout(day=row[0], exercises=[Exercise(**ex) for ex in row[1]])
+            for row in await cursor.fetchall()
+        ]
+    except Exception as e:
+        raise Exception(f"Failed to load previous week's workouts: {e}")
+
 async def load_feedback(user_id: int, target_day: str, db) -> DailyWorkoutFeedback:
     try:
         cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT workout_id, day
             FROM Workouts
@@ -130,12 +268,12 @@ async def load_feedback(user_id: int, target_day: str, db) -> DailyWorkoutFeedba
             """,
             (user_id, target_day, datetime.now(), datetime.now())
         )
-        workout_data = cursor.fetchone()
+        workout_data = await cursor.fetchone()
         if not workout_data:
             raise ValueError(f"No workout found for {target_day} from the previous week")
         workout_id, day = workout_data
 
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT exercise_name, sets_completed, reps_completed, difficulty, notes, soreness_level
             FROM Feedback
@@ -143,7 +281,7 @@ async def load_feedback(user_id: int, target_day: str, db) -> DailyWorkoutFeedba
             """,
             (workout_id,)
         )
-        feedback_rows = cursor.fetchall()
+        feedback_rows = await cursor.fetchall()
         feedback_list = [
             ExerciseFeedback(
                 name=row[0],
@@ -159,40 +297,265 @@ async def load_feedback(user_id: int, target_day: str, db) -> DailyWorkoutFeedba
     except Exception as e:
         raise Exception(f"Failed to load feedback: {e}")
 
+# Fragments shared by the next-workout context queries below
+_LAST_WEEK_CTE = """
+    last_week AS (
+        SELECT workout_id, day, exercises, created_at
+        FROM Workouts
+        WHERE user_id = %(user_id)s
+        AND created_at >= %(now)s - INTERVAL '14 days'
+        AND created_at < %(now)s - INTERVAL '7 days'
+    )
+""".strip()
+_PROFILE_JSON = """
+    (
+        SELECT row_to_json(u)
+        FROM (
+            SELECT name, age, height_cm, weight_kg, fat_percentage, experience_level,
+                   equipment, fitness_goal, gender, gym_strength, home_strength
+            FROM Users
+            WHERE user_id = %(user_id)s
+        ) u
+    ) AS profile
+""".strip()
+_PREVIOUS_WEEK_JSON = """
+    (
+        SELECT json_agg(json_build_object('day', day, 'exercises', exercises) ORDER BY created_at DESC)
+        FROM last_week
+    ) AS previous_week
+""".strip()
+# Feedback rows of the workout aliased t, as a JSON array (NULL when there are none)
+_FEEDBACK_JSON = """
+    (
+        SELECT json_agg(json_build_object(
+            'name', f.exercise_name,
+            'sets_completed', f.sets_completed,
+            'reps_completed', f.reps_completed,
+            'difficulty', f.difficulty,
+            'notes', f.notes,
+            'soreness_level', f.soreness_level
+        ))
+        FROM Feedback f
+        WHERE f.workout_id = t.workout_id
+    )
+""".strip()
+
+# The user, last week's workouts, last week's workout for the target day and its
+# feedback in one round trip. The target day's workout is picked the same way as in
+# load_previous_workout/load_feedback (the latest one for that day last week).
+NEXT_WORKOUT_CONTEXT_QUERY = f"""
+    WITH {_LAST_WEEK_CTE},
+    target AS (
+        SELECT workout_id, day, exercises
+        FROM last_week
+        WHERE day = %(day)s
+        ORDER BY created_at DESC
+        LIMIT 1
+    )
+    SELECT
+        {_PROFILE_JSON},
+        {_PREVIOUS_WEEK_JSON},
+        (SELECT json_build_object('day', day, 'exercises', exercises) FROM target) AS target_workout,
+        (SELECT {_FEEDBACK_JSON} FROM target t) AS feedback
+"""
+
+# The same for every day of last week that has a workout: each day's latest workout
+# with its feedback, for whole-week next-workout generation.
+NEXT_WEEK_CONTEXT_QUERY = f"""
+    WITH {_LAST_WEEK_CTE},
+    targets AS (
+        SELECT DISTINCT ON (day) workout_id, day, exercises
+        FROM last_week
+        ORDER BY day, created_at DESC
+    )
+    SELECT
+        {_PROFILE_JSON},
+        {_PREVIOUS_WEEK_JSON},
+        (
+            SELECT json_agg(json_build_object('day', t.day, 'exercises', t.exercises, 'feedback', {_FEEDBACK_JSON}))
+            FROM targets t
+        ) AS days
+"""
+
+def _daily_workout(data: dict) -> DailyWorkout:
+    return DailyWorkout(day=data["day"], exercises=[Exercise(**ex) for ex in data["exercises"]])
+
+def _user_from_profile(profile: dict) -> UserFitnessInput:
+    return UserFitnessInput(
+        name=profile["name"],
+        age=profile["age"],
+        height_cm=profile["height_cm"],
+        weight_kg=profile["weight_kg"],
+        fat_percentage=profile["fat_percentage"],
+        experience_level=profile["experience_level"],
+        equipment=profile["equipment"] or [],
+        fitness_goal=profile["fitness_goal"],
+        gender=profile["gender"],
+        gym_strength=GymStrength(**profile["gym_strength"]) if profile["gym_strength"] else None,
+        home_strength=HomeStrength(**profile["home_strength"]) if profile["home_strength"] else None
+    )
+
+def _daily_feedback(day: str, rows: Optional[List[dict]]) -> DailyWorkoutFeedback:
+    return DailyWorkoutFeedback(
+        day=day,
+        feedback=[
+            ExerciseFeedback(
+                name=row["name"],
+                sets_completed=row["sets_completed"],
+                reps_completed=row["reps_completed"] if row["reps_completed"] == "AMRAP" else int(row["reps_completed"]),
+                difficulty=row["difficulty"],
+                notes=row["notes"],
+                soreness_level=row["soreness_level"]
+            )
+            for row in rows or []
+        ]
+    )
+
+async def load_next_workout_context(user_id: int, target_day: str, db) -> NextWorkoutContext:
+    try:
+        cursor = db.cursor()
+        await cursor.execute(NEXT_WORKOUT_CONTEXT_QUERY, {"user_id": user_id, "day": target_day, "now": datetime.now()})
+        profile, previous_week, target_workout, feedback_rows = await cursor.fetchone()
+        if not profile:
+            raise ValueError("User not found in database")
+        if not target_workout:
+            raise ValueError(f"No previous workout found for {target_day} from the previous week")
+
+        user_input = _user_from_profile(profile)
+        # The profile comes with the context anyway, so refresh the cached copy
+        cache_user(user_id, user_input)
+        return NextWorkoutContext(
+            user_input=user_input,
+            previous_workout=_daily_workout(target_workout),
+            feedback=_daily_feedback(target_workout["day"], feedback_rows),
+            previous_week=[_daily_workout(workout) for workout in previous_week or []]
+        )
+    except Exception as e:
+        raise Exception(f"Failed to load next workout context: {e}")
+
+async def load_next_week_context(user_id: int, db) -> NextWeekContext:
+    try:
+        cursor = db.cursor()
+        await cursor.execute(NEXT_WEEK_CONTEXT_QUERY, {"user_id": user_id, "now": datetime.now()})
+        profile, previous_week, days = await cursor.fetchone()
+        if not profile:
+            raise ValueError("User not found in database")
+        if not days:
+            raise ValueError("No workouts found from the previous week")
+
+        user_input = _user_from_profile(profile)
+        cache_user(user_id, user_input)
+        return NextWeekContext(
+            user_input=user_input,
+            days=[(_daily_workout(day), _daily_feedback(day["day"], day["feedback"])) for day in days],
+            previous_week=[_daily_workout(workout) for workout in previous_week or []]
+        )
+    except Exception as e:
+        raise Exception(f"Failed to load next week context: {e}")
+
 async def save_feedback(user_id: int, workout_id: int, feedback: DailyWorkoutFeedback, db):
-    if not feedback.feedback:
+    await save_feedback_batch(user_id, [(workout_id, feedback)], db)
+
+async def save_feedback_batch(user_id: int, entries: List[Tuple[int, DailyWorkoutFeedback]], db):
+    # entries are (workout_id, feedback) pairs; every row goes out in one bulk insert
+    rows = [
+        (user_id, workout_id, fb.name, fb.sets_completed, str(fb.reps_completed), fb.difficulty, fb.notes, fb.soreness_level)
+        for workout_id, feedback in entries
+        for fb in feedback.feedback
+    ]
+    if not rows:
         return
     try:
         cursor = db.cursor()
-        for fb in feedback.feedback:
-            cursor.execute(
-                """
-                INSERT INTO Feedback (
-                    user_id, workout_id, exercise_name, sets_completed, reps_completed, 
-                    difficulty, notes, soreness_level
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    user_id,
-                    workout_id,
-                    fb.name,
-                    fb.sets_completed,
-                    str(fb.reps_completed),
-                    fb.difficulty,
-                    fb.notes,
-                    fb.soreness_level
+        await insert_rows(
+            cursor,
+            "Feedback",
+            ["user_id", "workout_id", "exercise_name", "sets_completed", "reps_completed", "difficulty", "notes", "soreness_level"],
+            rows
+        )
+    except Exception as e:
+        raise Exception(f"Failed to save feedback to database: {e}")
+
+async def save_precomputed_workout(user_id: int, source_workout_id: int, workout: DailyWorkout, ttl_hours: float, db):
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            INSERT INTO PrecomputedWorkouts (user_id, day, source_workout_id, exercises, expires_at)
+            VALUES (%s, %s, %s, %s, NOW() + %s * INTERVAL '1 hour')
+            ON CONFLICT (user_id, day, source_workout_id) DO UPDATE SET
+                exercises = EXCLUDED.exercises,
+                created_at = NOW(),
+                expires_at = EXCLUDED.expires_at,
+                consumed_at = NULL
+            """,
+            (user_id, workout.day, source_workout_id, Jsonb([ex.dict() for ex in workout.exercises]), ttl_hours)
+        )
+    except Exception as e:
+        raise Exception(f"Failed to save precomputed workout: {e}")
+
+async def take_precomputed_workout(user_id: int, target_day: str, db) -> Optional[Tuple[int, DailyWorkout]]:
+    # Consumes the freshest precomputed workout and saves it as the user's workout in
+    # one statement, so neither happens without the other and a miss costs one round trip
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            WITH taken AS (
+                UPDATE PrecomputedWorkouts
+                SET consumed_at = NOW()
+                WHERE (user_id, day, source_workout_id) = (
+                    SELECT user_id, day, source_workout_id
+                    FROM PrecomputedWorkouts
+                    WHERE user_id = %s
+                    AND day = %s
+                    AND consumed_at IS NULL
+                    AND expires_at > NOW()
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
                 )
+                RETURNING user_id, day, exercises
             )
-        db.commit()
+            INSERT INTO Workouts (user_id, day, exercises)
+            SELECT user_id, day, exercises FROM taken
+            RETURNING workout_id, day, exercises
+            """,
+            (user_id, target_day)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        return row[0], DailyWorkout(day=row[1], exercises=[Exercise(**ex) for ex in row[2]])
     except Exception as e:
-        db.rollback()
-        raise Exception(f"Failed to save feedback to database: {e}")
+        raise Exception(f"Failed to take precomputed workout: {e}")
+
+async def discard_precomputed_workouts(source_workout_ids: List[int], db):
+    # New feedback on a workout makes anything precomputed from it stale
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            "DELETE FROM PrecomputedWorkouts WHERE source_workout_id = ANY(%s)",
+            (source_workout_ids,)
+        )
+    except Exception as e:
+        raise Exception(f"Failed to discard precomputed workouts: {e}")
+
+async def discard_user_precomputed_workouts(user_id: int, days: List[str], db):
+    # A newly generated week supersedes the workouts precomputed for its days
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            "DELETE FROM PrecomputedWorkouts WHERE user_id = %s AND day = ANY(%s) AND consumed_at IS NULL",
+            (user_id, days)
+        )
+    except Exception as e:
+        raise Exception(f"Failed to discard precomputed workouts: {e}")
 
 async def save_or_update_user_dietary_preferences(user_id: int, preferences: dict, db):
     try:
         cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             INSERT INTO UserDietaryPreferences (user_id, allergies, is_vegan, is_vegetarian, other_restrictions)
             VALUES (%s, %s, %s, %s, %s)
@@ -204,48 +567,65 @@ async def save_or_update_user_dietary_preferences(user_id: int, preferences: dic
             """,
             (user_id, preferences.get('allergies', []), preferences.get('is_vegan', False), preferences.get('is_vegetarian', False), preferences.get('other_restrictions'))
         )
-        db.commit()
     except Exception as e:
-        db.rollback()
         raise Exception(f"Failed to save dietary preferences: {e}")
 
+async def load_user_dietary_preferences_version(user_id: int, db) -> Optional[tuple]:
+    try:
+        cursor = db.cursor()
+        await cursor.execute("SELECT xmin::text FROM UserDietaryPreferences WHERE user_id = %s", (user_id,))
+        record = await cursor.fetchone()
+        return tuple(record) if record else None
+    except Exception as e:
+        raise Exception(f"Failed to load dietary preferences version: {e}")
+
 async def load_user_dietary_preferences(user_id: int, db):
     try:
-        cursor = db.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cursor.execute("SELECT * FROM UserDietaryPreferences WHERE user_id = %s", (user_id,))
-        record = cursor.fetchone()
+        cursor = db.cursor(row_factory=dict_row)
+        await cursor.execute("SELECT * FROM UserDietaryPreferences WHERE user_id = %s", (user_id,))
+        record = await cursor.fetchone()
         return dict(record) if record else None
     except Exception as e:
         raise Exception(f"Failed to load dietary preferences: {e}")
 
 async def save_nutrition_plan(user_id: int, plan: List[dict], db):
     try:
-        cursor = db.cursor()
-        # First, delete any existing plan for this user to avoid stale data.
-        cursor.execute("DELETE FROM NutritionPlans WHERE user_id = %s", (user_id,))
-        
-        # Now, insert the new plan
-        for daily_plan in plan:
-            day = daily_plan['day']
-            meals_json = json.dumps(daily_plan['meals'])
-            cursor.execute(
-                """
-                INSERT INTO NutritionPlans (user_id, day, meals)
-                VALUES (%s, %s, %s)
-                RETURNING plan_id;
-                """,
-                (user_id, day, meals_json)
+        async with atomic(db):
+            cursor = db.cursor()
+            # First, delete any existing plan for this user to avoid stale data.
+            await cursor.execute("DELETE FROM NutritionPlans WHERE user_id = %s", (user_id,))
+
+            # Now, insert the new plan
+            await insert_rows(
+                cursor,
+                "NutritionPlans",
+                ["user_id", "day", "meals"],
+                [(user_id, daily_plan['day'], Jsonb(daily_plan['meals'])) for daily_plan in plan]
             )
-        db.commit()
     except Exception as e:
-        db.rollback()
         raise Exception(f"Failed to save nutrition plan: {e}")
 
+async def load_nutrition_plan_version(user_id: int, db) -> tuple:
+    # Row count and newest xmin of the rows load_nutrition_plan reads; never touches meals
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            SELECT COUNT(*), COALESCE(MAX(xmin::text::bigint), 0)
+            FROM NutritionPlans
+            WHERE user_id = %s AND created_at >= NOW() - INTERVAL '7 days'
+            """,
+            (user_id,)
+        )
+        return tuple(await cursor.fetchone())
+    except Exception as e:
+        raise Exception(f"Failed to load nutrition plan version: {e}")
+
 async def load_nutrition_plan(user_id: int, db):
     try:
-        cursor = db.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        cursor = db.cursor(row_factory=dict_row)
         # Load the most recent plan for the last 7 days
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT day, meals 
             FROM NutritionPlans 
@@ -254,7 +634,7 @@ async def load_nutrition_plan(user_id: int, db):
             """,
             (user_id,)
         )
-        records = cursor.fetchall()
+        records = await cursor.fetchall()
         # Assuming one plan per week, we group by the creation date implicitly by ordering
         if not records:
             return None
@@ -273,14 +653,25 @@ async def load_nutrition_plan(user_id: int, db):
 async def save_conversation(user_id: Optional[int], action: str, data: dict, db, workout_id: Optional[int] = None):
     try:
         cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             INSERT INTO Conversations (user_id, workout_id, action, data)
             VALUES (%s, %s, %s, %s)
             """,
-            (user_id, workout_id, action, Json(data))
+            (user_id, workout_id, action, Jsonb(data))
+        )
+    except Exception as e:
+        raise Exception(f"Failed to save conversation to database: {e}")
+
+async def save_conversations(entries: List[Tuple[Optional[int], str, dict, Optional[int]]], db):
+    # entries are (user_id, action, data, workout_id); all logged with one round trip
+    try:
+        cursor = db.cursor()
+        await insert_rows(
+            cursor,
+            "Conversations",
+            ["user_id", "workout_id", "action", "data"],
+            [(user_id, workout_id, action, Jsonb(data)) for user_id, action, data, workout_id in entries]
         )
-        db.commit()
     except Exception as e:
-        db.rollback()
-        raise Exception(f"Failed to save conversation to database: {e}")
\ No newline at end of file
+        raise Exception(f"Failed to save conversations to database: {e}")
@@ -0,0 +1,28 @@
+import hashlib
+from fastapi import Request, Response
+
+# Weak ETags for per-user resources, derived from a row version of the rows the
+# response is built from rather than from the body, so a repeat view is answered
+# with a 304 after one small query, without reading any JSONB payload.
+
+def make_etag(resource: str, user_id: int, version: tuple) -> str:
+    # Hashed so row versions (transaction ids) are not exposed to clients
+    digest = hashlib.sha256(f"{resource}:{user_id}:{version}".encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+def etag_headers(etag: str) -> dict:
+    # Clients may keep the response but must revalidate before reusing it
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
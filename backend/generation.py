@@ -0,0 +1,128 @@
+import logging
+from typing import List, Optional, Tuple
+from audit_log import audit_writer
+from db import atomic
+from db_ops import load_user, save_workout, save_workouts, load_recent_workouts, load_next_workout_context, load_next_week_context, save_nutrition_plan, load_nutrition_plan, take_precomputed_workout, discard_user_precomputed_workouts
+from models import DailyWorkout, NextWorkoutContext
+from nutrition_generator import generate_nutrition_plan
+from workout_cache import get_cached_week, cache_week
+from workout_generator import GenerationMode, generate_workout, generate_next_week_workout, generate_next_week_workouts, apply_slight_progression, requires_substitution
+from workout_prompts import DAYS
+
+logger = logging.getLogger(__name__)
+
+# The generation work behind the HTTP endpoints, shared with the background job workers.
+
+async def generate_current_week(user_id: int, user_input, mode: GenerationMode = "reasoning") -> List[DailyWorkout]:
+    weekly_workouts = get_cached_week(user_input, mode)
+    if weekly_workouts is None:
+        weekly_workouts = await generate_workout(user_input, mode)
+        # Only complete weeks are shared with the rest of the profile bucket
+        if len(weekly_workouts) == 7:
+            cache_week(user_input, weekly_workouts, mode)
+    else:
+        logger.info(f"Serving cached workout plan for user_id: {user_id}")
+    return weekly_workouts
+
+async def save_current_week(user_id: int, weekly_workouts: List[DailyWorkout], db):
+    # The whole week is one INSERT, so a failure never leaves a partial week behind
+    workout_ids = await save_workouts(user_id, weekly_workouts, db)
+    for workout, workout_id in zip(weekly_workouts, workout_ids):
+        await audit_writer.record(user_id, f"Generated workout for {workout.day}", workout.dict(), workout_id=workout_id)
+    logger.info(f"Generated and saved {len(weekly_workouts)} workouts for user_id: {user_id}")
+
+async def build_current_workout(user_id: int, db, mode: GenerationMode = "reasoning") -> List[DailyWorkout]:
+    # Reuse this week's workouts if the full week already exists (last 7 days)
+    existing = await load_recent_workouts(user_id, db)
+    if len(existing) >= 7:
+        logger.info(f"Returning {len(existing)} existing workouts for user_id: {user_id}")
+        return existing
+
+    # Generate new week's workout
+    user_input = await load_user(user_id, db)
+    logger.debug(f"Loaded user data for user_id: {user_id}")
+    weekly_workouts = await generate_current_week(user_id, user_input, mode)
+    await save_current_week(user_id, weekly_workouts, db)
+    return weekly_workouts
+
+async def compute_next_workout_from_context(context: NextWorkoutContext, target_day: str, mode: GenerationMode = "reasoning") -> DailyWorkout:
+    if not requires_substitution(context.feedback):
+        # Weight/rep adjustments are deterministic, apply them locally
+        return apply_slight_progression(context.previous_workout, context.feedback)
+    return await generate_next_week_workout(
+        context.user_input, context.feedback, context.previous_workout, context.previous_week, target_day, mode
+    )
+
+async def compute_next_workout(user_id: int, target_day: str, db, mode: GenerationMode = "reasoning") -> DailyWorkout:
+    context = await load_next_workout_context(user_id, target_day, db)
+    return await compute_next_workout_from_context(context, target_day, mode)
+
+async def take_next_workout(user_id: int, target_day: str, db) -> Optional[Tuple[int, DailyWorkout]]:
+    # Serves the nightly pre-generated workout when there is a fresh one
+    taken = await take_precomputed_workout(user_id, target_day, db)
+    if taken is not None:
+        logger.info(f"Serving precomputed {target_day} workout for user_id: {user_id}")
+    return taken
+
+async def record_next_workout(user_id: int, target_day: str, workout_id: int, workout: DailyWorkout):
+    await audit_writer.record(user_id, f"Generated next workout for {target_day}", workout.dict(), workout_id=workout_id)
+    logger.info(f"Generated workout_id: {workout_id} for user_id: {user_id}")
+
+async def build_next_workout(user_id: int, target_day: str, db, mode: GenerationMode = "reasoning") -> Tuple[int, DailyWorkout]:
+    taken = await take_next_workout(user_id, target_day, db)
+    if taken is None:
+        workout = await compute_next_workout(user_id, target_day, db, mode)
+        taken = await save_workout(user_id, workout, db), workout
+    workout_id, workout = taken
+    await record_next_workout(user_id, target_day, workout_id, workout)
+    return workout_id, workout
+
+async def compute_next_week(user_id: int, db, mode: GenerationMode = "reasoning") -> List[DailyWorkout]:
+    # Next week for every day that had a workout last week. Days whose feedback only
+    # calls for weight/rep adjustments are progressed locally; the days that need an
+    # exercise swap go to the model together in one call.
+    context = await load_next_week_context(user_id, db)
+    days = sorted(context.days, key=lambda day: DAYS.index(day[0].day) if day[0].day in DAYS else len(DAYS))
+    substitutions = [(workout, feedback) for workout, feedback in days if requires_substitution(feedback)]
+
+    generated = {}
+    if substitutions:
+        logger.info(f"Generating {len(substitutions)} of {len(days)} days with the model for user_id: {user_id}")
+        workouts = await generate_next_week_workouts(context.user_input, substitutions, context.previous_week, mode)
+        generated = {workout.day: workout for workout in workouts}
+    return [
+        generated[workout.day] if workout.day in generated else apply_slight_progression(workout, feedback)
+        for workout, feedback in days
+    ]
+
+async def build_next_week(user_id: int, db, mode: GenerationMode = "reasoning") -> List[Tuple[int, DailyWorkout]]:
+    workouts = await compute_next_week(user_id, db, mode)
+    # Otherwise /workouts/next/ would later serve a precomputed day as a second workout
+    async with atomic(db):
+        workout_ids = await save_workouts(user_id, workouts, db)
+        await discard_user_precomputed_workouts(user_id, [workout.day for workout in workouts], db)
+    for workout, workout_id in zip(workouts, workout_ids):
+        await audit_writer.record(user_id, f"Generated next workout for {workout.day}", workout.dict(), workout_id=workout_id)
+    logger.info(f"Generated and saved next week's {len(workouts)} workouts for user_id: {user_id}")
+    return list(zip(workout_ids, workouts))
+
+async def build_nutrition_plan(user_id: int, db) -> List[dict]:
+    # Attempt to load an existing plan from the last 7 days
+    existing_plan = await load_nutrition_plan(user_id, db)
+    if existing_plan:
+        logger.info(f"Found existing nutrition plan for user_id: {user_id}. Returning it.")
+        return existing_plan
+
+    # If no recent plan, generate a new one
+    logger.info(f"No recent nutrition plan found for user_id: {user_id}. Generating a new one.")
+    user_input = await load_user(user_id, db)
+
+    logger.info(f"Generating new nutrition plan for user_id: {user_id}")
+    new_plan = await generate_nutrition_plan(user_id, user_input, db)
+
+    # Save the new plan
+    await save_nutrition_plan(user_id, new_plan, db)
+
+    await audit_writer.record(user_id, "Generated new nutrition plan", {"status": "success"})
+    logger.info(f"Successfully generated and saved new nutrition plan for user_id: {user_id}")
+    return new_plan
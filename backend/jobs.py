@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from db import checkout
+from admission import LLMOverloadedError, llm_priority
+from db_ops import load_user, load_recent_workouts, load_next_workout_context, save_workout
+from generation import generate_current_week, save_current_week, take_next_workout, compute_next_workout_from_context, record_next_workout, build_nutrition_plan
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+# Running jobs refresh their lease (updated_at) every JOB_HEARTBEAT_INTERVAL seconds.
+# A job whose lease is older than JOB_STALE_AFTER is assumed lost (e.g. a crashed
+# process) and requeued by the sweep, which runs on the heartbeat interval too.
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Jobs shed by the model admission controller are retried after an exponential
+# backoff (never sooner than its Retry-After) instead of failing, up to JOB_MAX_DEFERRALS times
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "30"))
+JOB_MAX_BACKOFF = float(os.getenv("JOB_MAX_BACKOFF", "900"))
+JOB_MAX_DEFERRALS = int(os.getenv("JOB_MAX_DEFERRALS", "8"))
+
+# Handlers check out a connection only around their database steps, so a worker
+# waiting on the model does not hold one of the pool's connections.
+
+async def _run_current_workout(job: dict):
+    user_id = job["user_id"]
+    async with checkout(owner=f"job {job['job_id']}") as db:
+        existing = await load_recent_workouts(user_id, db)
+        user_input = await load_user(user_id, db) if len(existing) < 7 else None
+    if user_input is None:
+        return [workout.dict() for workout in existing]
+
+    workouts = await generate_current_week(user_id, user_input, job["payload"].get("mode", "reasoning"))
+    async with checkout(owner=f"job {job['job_id']}") as db:
+        await save_current_week(user_id, workouts, db)
+    return [workout.dict() for workout in workouts]
+
+async def _run_next_workout(job: dict):
+    user_id, target_day = job["user_id"], job["payload"]["target_day"]
+    async with checkout(owner=f"job {job['job_id']}") as db:
+        taken = await take_next_workout(user_id, target_day, db)
+        context = await load_next_workout_context(user_id, target_day, db) if taken is None else None
+    if taken is None:
+        workout = await compute_next_workout_from_context(context, target_day, job["payload"].get("mode", "reasoning"))
+        async with checkout(owner=f"job {job['job_id']}") as db:
+            taken = await save_workout(user_id, workout, db), workout
+    workout_id, workout = taken
+    await record_next_workout(user_id, target_day, workout_id, workout)
+    return {"workout_id": workout_id, "workout": workout.dict()}
+
+async def _run_nutrition_plan(job: dict):
+    # No model call: the plan is chosen from the meal catalog
+    async with checkout(owner=f"job {job['job_id']}") as db:
+        return await build_nutrition_plan(job["user_id"], db)
+
+JOB_HANDLERS = {
+    "current_workout": _run_current_workout,
+    "next_workout": _run_next_workout,
+    "nutrition_plan": _run_nutrition_plan
+}
+
+async def enqueue_job(kind: str, user_id: int, payload: dict, db) -> int:
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    try:
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            INSERT INTO GenerationJobs (kind, user_id, payload)
+            VALUES (%s, %s, %s)
+            RETURNING job_id
+            """,
+            (kind, user_id, Jsonb(payload))
+        )
+        job_id = (await cursor.fetchone())[0]
+    except Exception as e:
+        raise Exception(f"Failed to enqueue job: {e}")
+    job_queue.notify()
+    return job_id
+
+async def load_job(job_id: int, db) -> Optional[dict]:
+    try:
+        cursor = db.cursor(row_factory=dict_row)
+        await cursor.execute(
+            """
+            SELECT job_id, kind, user_id, status, progress, attempts, result, error, created_at, started_at, updated_at, run_after
+            FROM GenerationJobs
+            WHERE job_id = %s
+            """,
+            (job_id,)
+        )
+        return await cursor.fetchone()
+    except Exception as e:
+        raise Exception(f"Failed to load job: {e}")
+
+# Bounded pool of asyncio workers that claim queued jobs from the GenerationJobs table.
+# Claims use FOR UPDATE SKIP LOCKED, so several app processes can share the table
+# without an external broker. The attempt number of a claim fences its heartbeats and
+# final update, so a worker whose lease was swept cannot overwrite the job's next run.
+class JobQueue:
+    def __init__(self, workers: int, poll_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        logger.info(f"Started {self.workers} job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _requeue_stale(self, db):
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            UPDATE GenerationJobs
+            SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+                error = CASE WHEN attempts >= %s THEN 'Job abandoned after too many attempts' ELSE error END,
+                progress = 0,
+                run_after = NOW(),
+                updated_at = NOW()
+            WHERE status = 'running'
+            AND updated_at < NOW() - %s * INTERVAL '1 second'
+            """,
+            (JOB_MAX_ATTEMPTS, JOB_MAX_ATTEMPTS, JOB_STALE_AFTER)
+        )
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} stale jobs")
+            self.notify()
+
+    async def _sweeper(self):
+        while True:
+            try:
+                async with checkout(owner="job sweeper") as db:
+                    await self._requeue_stale(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job sweep failed: {str(e)}")
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+
+    async def _claim(self, db) -> Optional[dict]:
+        cursor = db.cursor(row_factory=dict_row)
+        await cursor.execute(
+            """
+            UPDATE GenerationJobs
+            SET status = 'running', progress = 10, attempts = attempts + 1, started_at = NOW(), updated_at = NOW()
+            WHERE job_id = (
+                SELECT job_id FROM GenerationJobs
+                WHERE status = 'queued'
+                AND run_after <= NOW()
+                ORDER BY created_at
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING job_id, kind, user_id, payload, attempts, deferrals
+            """
+        )
+        job = await cursor.fetchone()
+        return job
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                async with checkout(owner=f"job {job['job_id']} heartbeat") as db:
+                    cursor = db.cursor()
+                    await cursor.execute(
+                        """
+                        UPDATE GenerationJobs SET updated_at = NOW()
+                        WHERE job_id = %s AND status = 'running' AND attempts = %s
+                        """,
+                        (job["job_id"], job["attempts"])
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The next beat may still land before the lease runs out
+                logger.warning(f"Heartbeat for job {job['job_id']} failed: {str(e)}")
+
+    async def _finish(self, job: dict, db, result=None, error: Optional[str] = None):
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            UPDATE GenerationJobs
+            SET status = %s, progress = 100, result = %s, error = %s, updated_at = NOW()
+            WHERE job_id = %s AND status = 'running' AND attempts = %s
+            """,
+            ("failed" if error else "done", Jsonb(result) if result is not None else None, error, job["job_id"], job["attempts"])
+        )
+
+    async def _defer(self, job: dict, db, delay: float, error: str):
+        # Shedding is not the job's fault, so the attempt is handed back
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            UPDATE GenerationJobs
+            SET status = 'queued', progress = 0, attempts = attempts - 1, deferrals = deferrals + 1,
+                error = %s, run_after = NOW() + %s * INTERVAL '1 second', updated_at = NOW()
+            WHERE job_id = %s AND status = 'running' AND attempts = %s
+            """,
+            (error, delay, job["job_id"], job["attempts"])
+        )
+
+    async def _worker(self, n: int):
+        # Queued jobs have no one waiting on the response, so interactive calls go first
+        llm_priority.set("job")
+        while True:
+            try:
+                async with checkout(owner=f"job worker {n}") as db:
+                    job = await self._claim(db)
+                    if job is None:
+                        self._wakeup.clear()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {n} failed: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run(self, job: dict):
+        job_id = job["job_id"]
+        logger.info(f"Running job {job_id} ({job['kind']}) for user_id: {job['user_id']}")
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        result = error = None
+        try:
+            result = await JOB_HANDLERS[job["kind"]](job)
+        except LLMOverloadedError as e:
+            error = str(e)
+            if job["deferrals"] < JOB_MAX_DEFERRALS:
+                delay = min(JOB_MAX_BACKOFF, max(e.retry_after, JOB_RETRY_BACKOFF * 2 ** job["deferrals"]))
+                logger.warning(f"Job {job_id} shed by the model queue, retrying in {delay:.0f}s: {error}")
+                async with checkout(owner=f"job {job_id}") as db:
+                    await self._defer(job, db, delay, error)
+                return
+        except Exception as e:
+            error = str(e)
+        finally:
+            heartbeat.cancel()
+
+        async with checkout(owner=f"job {job_id}") as db:
+            await self._finish(job, db, result=result, error=error)
+        if error:
+            logger.error(f"Job {job_id} failed: {error}")
+        else:
+            logger.info(f"Job {job_id} done")
+
+job_queue = JobQueue(JOB_WORKERS, JOB_POLL_INTERVAL)
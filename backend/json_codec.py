@@ -0,0 +1,44 @@
+import json
+import os
+from decimal import Decimal
+from typing import Any
+import numpy as np
+from fastapi.responses import JSONResponse
+from psycopg.types.json import set_json_dumps, set_json_loads
+
+# JSON encoder/decoder shared by the JSONB adapters and the plan endpoints.
+# JSON_CODEC picks the implementation: "orjson" (default) or the standard library's
+# "json". Both produce compact UTF-8 bytes.
+JSON_CODEC = os.getenv("JSON_CODEC", "orjson")
+
+def _default(obj: Any):
+    # NUMERIC columns come back as Decimal; the meal optimizer works in numpy
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if JSON_CODEC == "orjson":
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+    loads = orjson.loads
+elif JSON_CODEC == "json":
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    loads = json.loads
+else:
+    raise ValueError(f"Unknown JSON_CODEC: {JSON_CODEC}")
+
+def register_json_codec(conn):
+    # Used for every json/jsonb value read or written (Jsonb(...)) on this connection
+    set_json_dumps(dumps, conn)
+    set_json_loads(loads, conn)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
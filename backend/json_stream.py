@@ -0,0 +1,200 @@
+import json
+import re
+from typing import Callable, List, Optional, Union
+from models import DailyWorkout, Exercise
+
+_BARE_WORDS = {"AMRAP": '"AMRAP"', "None": "null", "True": "true", "False": "false"}
+_CLOSERS = {"{": "}", "[": "]"}
+# First non-space character that can follow an opener that starts a JSON segment. Keys
+# may be unquoted, so any letter can open an object; arrays hold days or exercises.
+_SEGMENT_STARTS = {"{": set("\"'}_"), "[": set("{[]\"'-0123456789")}
+
+def repair_json(text: str) -> str:
+    # Fixes the defects the model commonly produces, outside of string literals only:
+    # trailing commas, single-quoted strings, unquoted keys, unquoted AMRAP and Python literals.
+    out = []
+    i = 0
+    length = len(text)
+    while i < length:
+        ch = text[i]
+        if ch in "\"'":
+            j = i + 1
+            chars = []
+            while j < length and text[j] != ch:
+                if text[j] == "\\" and j + 1 < length:
+                    # \' is not a JSON escape; the quote needs none inside double quotes
+                    chars.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                if ch == "'" and text[j] == '"':
+                    chars.append('\\"')
+                else:
+                    chars.append(text[j])
+                j += 1
+            out.append('"' + "".join(chars) + '"')
+            i = j + 1
+        elif ch == ",":
+            j = i + 1
+            while j < length and text[j].isspace():
+                j += 1
+            if j < length and text[j] in "}]":
+                i += 1
+                continue
+            out.append(ch)
+            i += 1
+        elif ch.isalpha():
+            j = i
+            while j < length and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < length and text[k].isspace():
+                k += 1
+            if k < length and text[k] == ":":
+                # Unquoted object key
+                out.append(f'"{word}"')
+            else:
+                out.append(_BARE_WORDS.get(word, word))
+            i = j
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+def loads_lenient(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(text))
+
+def _to_int(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        match = re.match(r"\s*(\d+)", value)
+        if match:
+            return int(match.group(1))
+    return None
+
+def _to_exercise(data: dict, normalize_weight: Callable[[str, str], str]) -> Optional[Exercise]:
+    name = data.get("name")
+    sets = _to_int(data.get("sets"))
+    reps = data.get("reps")
+    if not isinstance(name, str) or sets is None:
+        return None
+    if not (isinstance(reps, str) and reps.strip().upper() == "AMRAP"):
+        reps = _to_int(reps)
+        if reps is None:
+            return None
+    else:
+        reps = "AMRAP"
+    weight = data.get("weight", "N/A")
+    if isinstance(weight, (int, float)) and not isinstance(weight, bool):
+        weight = f"{weight}kg"
+    elif not isinstance(weight, str) or not weight.strip():
+        weight = "N/A"
+    try:
+        weight = normalize_weight(weight.strip(), name)
+    except ValueError:
+        # Free-text weights like "light" cannot be rounded
+        weight = "N/A"
+    return Exercise(name=name, sets=sets, reps=reps, weight=weight)
+
+def _keep_weight(weight: str, exercise_name: str) -> str:
+    return weight
+
+# Incrementally scans model output (streamed chunks or the complete text) for balanced
+# JSON arrays and objects, outside and inside code fences alike, and returns each
+# DailyWorkout and Exercise as soon as its object closes. Reasoning prose around the
+# JSON is ignored, and mismatched brackets or stray quotes in it do not stop later
+# objects from parsing.
+class WorkoutStreamParser:
+    def __init__(self, normalize_weight: Callable[[str, str], str] = _keep_weight):
+        self.normalize_weight = normalize_weight
+        self._text = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._pending = False
+
+    def feed(self, chunk: str) -> List[Union[DailyWorkout, Exercise]]:
+        found = []
+        for ch in chunk:
+            if self._pending and not ch.isspace():
+                # Prose like "[max" never becomes a segment, so its quotes are not tracked
+                self._pending = False
+                opener = self._stack[0][0]
+                if ch not in _SEGMENT_STARTS[opener] and not (opener == "{" and ch.isalpha()):
+                    self._stack = []
+                    self._text = []
+            if not self._stack:
+                if ch in _CLOSERS:
+                    self._text = [ch]
+                    self._stack.append((ch, 0))
+                    self._pending = True
+                continue
+            self._text.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                elif ch == "\n":
+                    # JSON strings cannot span lines, so this quote was a stray one in prose
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append((ch, len(self._text) - 1))
+            elif ch in "}]":
+                self._close(ch, found)
+        return found
+
+    def _close(self, closer: str, found: list):
+        # Pop back to the matching opener; unmatched openers in between are prose
+        while self._stack and _CLOSERS[self._stack[-1][0]] != closer:
+            self._stack.pop()
+        if not self._stack:
+            return
+        opener, start = self._stack.pop()
+        if opener == "{":
+            value = self._parse("".join(self._text[start:]))
+            if isinstance(value, dict):
+                item = self._classify(value)
+                if item is not None:
+                    found.append(item)
+        if not self._stack:
+            self._text = []
+
+    def _parse(self, segment: str):
+        try:
+            return loads_lenient(segment)
+        except (json.JSONDecodeError, RecursionError):
+            return None
+
+    def _classify(self, value: dict):
+        if isinstance(value.get("day"), str) and isinstance(value.get("exercises"), list):
+            exercises = [
+                _to_exercise(ex, self.normalize_weight) for ex in value["exercises"] if isinstance(ex, dict)
+            ]
+            return DailyWorkout(day=value["day"], exercises=[ex for ex in exercises if ex is not None])
+        if "name" in value and "sets" in value:
+            return _to_exercise(value, self.normalize_weight)
+        return None
+
+def extract_workouts(text: str, normalize_weight: Callable[[str, str], str] = _keep_weight) -> List[DailyWorkout]:
+    parser = WorkoutStreamParser(normalize_weight)
+    by_day = {}
+    for item in parser.feed(text):
+        if isinstance(item, DailyWorkout):
+            # A repeated day (e.g. an example before the final answer) is replaced by the later one
+            by_day[item.day] = item
+    return list(by_day.values())
+
+def extract_daily_workout(text: str, normalize_weight: Callable[[str, str], str] = _keep_weight) -> Optional[DailyWorkout]:
+    workouts = extract_workouts(text, normalize_weight)
+    return workouts[-1] if workouts else None
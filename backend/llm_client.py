@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+import google.generativeai as genai
+from dotenv import load_dotenv
+from admission import AdmissionController, RATE_LIMIT, BURST, MAX_QUEUE, MAX_QUEUE_WAIT, llm_priority
+
+load_dotenv()
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+CALL_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+
+class LLMTimeoutError(Exception):
+    pass
+
+# Async wrapper around a Gemini model: calls never block the event loop, and every
+# call goes through the admission controller, which runs at most max_concurrency at
+# once within the rate limit, highest priority first, and sheds what cannot wait.
+class LLMClient:
+    def __init__(self, model: genai.GenerativeModel, admission: AdmissionController, timeout: float):
+        self.model = model
+        # One model object per system instruction; the instructions are a handful of constants
+        self._models = {None: model}
+        self.admission = admission
+        self.timeout = timeout
+        self.in_flight = 0
+        self.calls_total = 0
+        self.timeouts_total = 0
+        self.errors_total = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        # Per-label (e.g. generation mode) call counts, latency and token usage for benchmarking
+        self.by_label = {}
+
+    def _model_for(self, system_instruction: str = None) -> genai.GenerativeModel:
+        if system_instruction not in self._models:
+            self._models[system_instruction] = genai.GenerativeModel(self.model.model_name, system_instruction=system_instruction)
+        return self._models[system_instruction]
+
+    async def _acquire(self):
+        queued_at = time.monotonic()
+        await self.admission.acquire(llm_priority.get())
+        waited = time.monotonic() - queued_at
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        self.in_flight += 1
+        return time.monotonic()
+
+    def _release(self, started: float):
+        elapsed = time.monotonic() - started
+        self.calls_total += 1
+        self.latency_total += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+        self.in_flight -= 1
+        self.admission.release()
+
+    def _record_label(self, label: str, started: float, usage):
+        stats = self.by_label.setdefault(label, {"calls": 0, "latency_total": 0.0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0})
+        stats["calls"] += 1
+        stats["latency_total"] += time.monotonic() - started
+        if usage is not None:
+            prompt_tokens = usage.prompt_token_count or 0
+            cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+            output_tokens = usage.candidates_token_count or 0
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+            stats["output_tokens"] += output_tokens
+            logger.info(f"Gemini call [{label}]: {prompt_tokens} prompt tokens ({cached_tokens} cached), {output_tokens} output tokens")
+
+    def _timed_out(self, timeout: float):
+        self.timeouts_total += 1
+        logger.error(f"Gemini call timed out after {timeout}s")
+        return LLMTimeoutError(f"Model call timed out after {timeout}s")
+
+    async def generate(self, prompt, timeout: float = None, label: str = "default", system_instruction: str = None, **kwargs):
+        timeout = timeout or self.timeout
+        model = self._model_for(system_instruction)
+        started = await self._acquire()
+        try:
+            response = await asyncio.wait_for(model.generate_content_async(prompt, **kwargs), timeout)
+            self._record_label(label, started, getattr(response, "usage_metadata", None))
+            return response
+        except asyncio.TimeoutError:
+            raise self._timed_out(timeout)
+        except Exception:
+            self.errors_total += 1
+            raise
+        finally:
+            self._release(started)
+
+    async def stream(self, prompt, timeout: float = None, label: str = "default", system_instruction: str = None, **kwargs):
+        # Yields response text chunks as they arrive; the timeout bounds the whole stream
+        timeout = timeout or self.timeout
+        model = self._model_for(system_instruction)
+        started = await self._acquire()
+        deadline = started + timeout
+        try:
+            response = await asyncio.wait_for(
+                model.generate_content_async(prompt, stream=True, **kwargs), timeout
+            )
+            chunks = response.__aiter__()
+            usage = None
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                # The last chunk carries the usage totals for the whole response
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                yield chunk.text
+            self._record_label(label, started, usage)
+        except asyncio.TimeoutError:
+            raise self._timed_out(timeout)
+        except Exception:
+            self.errors_total += 1
+            raise
+        finally:
+            self._release(started)
+
+    def stats(self) -> dict:
+        return {
+            "model": MODEL_NAME,
+            "max_concurrency": self.admission.max_concurrency,
+            "in_flight": self.in_flight,
+            "calls_total": self.calls_total,
+            "timeouts_total": self.timeouts_total,
+            "errors_total": self.errors_total,
+            "queue_wait_avg_ms": round(1000 * self.queue_wait_total / self.calls_total, 2) if self.calls_total else 0.0,
+            "queue_wait_max_ms": round(1000 * self.queue_wait_max, 2),
+            "latency_avg_ms": round(1000 * self.latency_total / self.calls_total, 2) if self.calls_total else 0.0,
+            "latency_max_ms": round(1000 * self.latency_max, 2),
+            "by_label": {
+                label: {
+                    "calls": stats["calls"],
+                    "latency_avg_ms": round(1000 * stats["latency_total"] / stats["calls"], 2),
+                    "prompt_tokens_avg": round(stats["prompt_tokens"] / stats["calls"], 1),
+                    "cached_tokens_avg": round(stats["cached_tokens"] / stats["calls"], 1),
+                    "output_tokens_avg": round(stats["output_tokens"] / stats["calls"], 1)
+                }
+                for label, stats in self.by_label.items()
+            },
+            "admission": self.admission.stats()
+        }
+
+llm_client = LLMClient(
+    genai.GenerativeModel(MODEL_NAME),
+    AdmissionController(RATE_LIMIT, BURST, MAX_CONCURRENCY, MAX_QUEUE, MAX_QUEUE_WAIT),
+    CALL_TIMEOUT
+)
@@ -1,10 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from db import get_db_connection
-from db_ops import save_user, load_user, save_workout, load_previous_workout, load_feedback, save_feedback, save_conversation, save_nutrition_plan, load_nutrition_plan, save_or_update_user_dietary_preferences, load_user_dietary_preferences
-from schemas import UserFitnessInputSchema, UserResponse, WorkoutResponse, DailyWorkoutFeedbackSchema, FeedbackResponse, NextWorkoutRequest, DailyWorkoutSchema, DailyNutritionPlanSchema, UserDietaryPreferencesSchema, UserDietaryPreferencesResponse
-from workout_generator import generate_workout, apply_slight_progression, needs_modification
-from nutrition_generator import generate_nutrition_plan
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from psycopg_pool import PoolTimeout
+from db import get_db_connection, checkout, atomic, open_pool, close_pool, pool_monitor, CHECKOUT_TIMEOUT
+from db_ops import save_user, load_user, save_workout, load_recent_workouts, save_feedback, save_feedback_batch, resolve_workout_ids, discard_precomputed_workouts, save_or_update_user_dietary_preferences, load_user_dietary_preferences, load_workout_week_version, load_nutrition_plan, load_nutrition_plan_version, load_user_dietary_preferences_version
+from schemas import UserFitnessInputSchema, UserResponse, WorkoutResponse, DailyWorkoutFeedbackSchema, FeedbackResponse, BatchFeedbackResponse, NextWorkoutRequest, NextWeekRequest, NextWeekResponse, DailyWorkoutSchema, DailyNutritionPlanSchema, UserDietaryPreferencesSchema, UserDietaryPreferencesResponse, JobRequest, JobResponse, JobStatusResponse
+from llm_client import llm_client, LLMTimeoutError
+from admission import LLMOverloadedError, llm_priority
+from audit_log import audit_writer
+from json_codec import dumps, FastJSONResponse
+from etag import make_etag, etag_matches, etag_headers, not_modified
+from migrate import MIGRATE_ON_STARTUP, run_migrations
+from meal_catalog import meal_catalog
+from workout_cache import get_cached_week, cache_week, workout_plan_cache
+from profile_cache import user_profile_cache
+from workout_generator import stream_workout, GenerationMode
+from generation import build_current_workout, build_next_workout, build_next_week, build_nutrition_plan
+from jobs import job_queue, enqueue_job, load_job
+from pregenerate import pregeneration_scheduler
 from typing import List
 from datetime import datetime, timedelta
 import logging
@@ -13,7 +27,25 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_pool()
+    if MIGRATE_ON_STARTUP:
+        async with checkout(owner="startup migrations") as db:
+            await run_migrations(db)
+    await audit_writer.start()
+    await job_queue.start()
+    await pregeneration_scheduler.start()
+    yield
+    await pregeneration_scheduler.stop()
+    await job_queue.stop()
+    # Flushes queued audit entries, so it has to run while the pool is still open
+    await audit_writer.stop()
+    await close_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+GENERATION_MODES = GenerationMode.__args__
 
 # Add CORS middleware
 app.add_middleware(
@@ -22,137 +54,222 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc: PoolTimeout):
+    logger.error(f"Timed out waiting for a database connection on {request.url.path}: {str(exc)}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, please retry shortly"},
+        headers={"Retry-After": str(int(CHECKOUT_TIMEOUT))}
+    )
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request, exc: LLMOverloadedError):
+    logger.warning(f"Shed model call on {request.url.path}: {str(exc)}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.get("/metrics/db/")
+async def get_db_pool_metrics():
+    return pool_monitor.stats()
+
+@app.get("/metrics/llm/")
+async def get_llm_metrics():
+    return llm_client.stats()
+
+@app.get("/metrics/pregeneration/")
+async def get_pregeneration_metrics():
+    return {"last_run": pregeneration_scheduler.last_report}
+
+@app.get("/metrics/audit/")
+async def get_audit_metrics():
+    return audit_writer.stats()
+
+@app.get("/metrics/cache/")
+async def get_cache_metrics():
+    return {
+        "workout_plans": workout_plan_cache.stats(),
+        "user_profiles": user_profile_cache.stats(),
+        "meal_catalog": meal_catalog.stats()
+    }
+
 @app.post("/users/", response_model=UserResponse)
 async def create_user(user_input: UserFitnessInputSchema, db=Depends(get_db_connection)):
     try:
         user_id = await save_user(user_input, db)
         logger.info(f"Created user with id: {user_id}")
-        await save_conversation(user_id, "User created", user_input.dict(), db)
+        await audit_writer.record(user_id, "User created", user_input.dict())
         return {"user_id": user_id, "message": "User created successfully"}
     except Exception as e:
         logger.error(f"Failed to create user: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
-@app.post("/workouts/current/", response_model=List[DailyWorkoutSchema])
+@app.post("/workouts/current/", response_model=List[DailyWorkoutSchema], response_class=FastJSONResponse)
 async def generate_current_workout(request: dict, db=Depends(get_db_connection)):
     try:
         user_id = request.get('user_id')
         if not isinstance(user_id, int):
             raise ValueError(f"Invalid user_id: {user_id}")
-        logger.info(f"Generating workout for user_id: {user_id}")
-
-        # Check if workouts exist for the user for the current week (last 7 days)
-        cursor = db.cursor()
-        cursor.execute(
-            """
-            SELECT COUNT(*) 
-            FROM Workouts 
-            WHERE user_id = %s 
-            AND created_at >= %s - INTERVAL '7 days'
-            """,
-            (user_id, datetime.now())
-        )
-        workout_count = cursor.fetchone()[0]
-        logger.debug(f"Workout count for user_id {user_id}: {workout_count}")
-
-        if workout_count >= 7:
-            # Fetch existing workouts
-            cursor.execute(
-                """
-                SELECT day, exercises
-                FROM Workouts
-                WHERE user_id = %s
-                AND created_at >= %s - INTERVAL '7 days'
-                ORDER BY created_at DESC
-                """,
-                (user_id, datetime.now())
-            )
-            workouts_data = cursor.fetchall()
-            weekly_workouts = []
-            for workout_data in workouts_data:
-                exercises = [
-                    Exercise(**ex)
-                    for ex in workout_data[1]
-                ]
-                weekly_workouts.append(DailyWorkoutSchema(day=workout_data[0], exercises=exercises))
-            logger.info(f"Returning {len(weekly_workouts)} existing workouts for user_id: {user_id}")
-            return weekly_workouts
-
-        # Generate new week's workout
-        user_input = await load_user(user_id, db)
-        logger.debug(f"Loaded user data for user_id: {user_id}")
-        weekly_workouts = await generate_workout(user_input)
-        
-        # Save each day's workout
-        for workout in weekly_workouts:
-            workout_id = await save_workout(user_id, workout, db)
-            await save_conversation(user_id, f"Generated workout for {workout.day}", workout.dict(), db, workout_id=workout_id)
-        logger.info(f"Generated and saved {len(weekly_workouts)} workouts for user_id: {user_id}")
-        
-        return weekly_workouts
+        mode = request.get('mode', 'reasoning')
+        if mode not in GENERATION_MODES:
+            raise ValueError(f"Invalid mode: {mode}")
+        logger.info(f"Generating workout for user_id: {user_id} ({mode} mode)")
+        return await build_current_workout(user_id, db, mode)
     except ValueError as e:
         logger.error(f"ValueError in generate_current_workout: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    except LLMOverloadedError:
+        raise
+    except LLMTimeoutError as e:
+        logger.error(f"Workout generation timed out for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to generate workout for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate workout: {str(e)}")
-    finally:
-        cursor.close()
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+async def _iterate(workouts):
+    for workout in workouts:
+        yield workout
+
+@app.post("/workouts/current/stream/")
+async def stream_current_workout(request: dict):
+    user_id = request.get('user_id')
+    if not isinstance(user_id, int):
+        raise HTTPException(status_code=400, detail=f"Invalid user_id: {user_id}")
+    mode = request.get('mode', 'reasoning')
+    if mode not in GENERATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode: {mode}")
+    logger.info(f"Streaming workout for user_id: {user_id} ({mode} mode)")
+    owner = "POST /workouts/current/stream/"
+
+    # Everything that can refuse the request runs before the response starts, so it
+    # still gets a real status code (and Retry-After when the model is overloaded)
+    # instead of an error event on a 200 stream.
+    try:
+        async with checkout(owner=owner) as db:
+            existing = await load_recent_workouts(user_id, db)
+            user_input = await load_user(user_id, db) if len(existing) < 7 else None
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to load workouts for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate workout: {str(e)}")
+    cached = get_cached_week(user_input, mode) if user_input is not None else None
+    if user_input is not None and cached is None:
+        llm_client.admission.check(llm_priority.get())
+
+    # The response outlives the request dependencies, so connections are checked out
+    # briefly around each database step instead of being held for the whole stream.
+    async def events():
+        try:
+            if user_input is None:
+                for workout in existing:
+                    yield _sse("workout", workout.dict())
+                yield _sse("done", {"count": len(existing), "source": "existing"})
+                return
+
+            source = _iterate(cached) if cached is not None else stream_workout(user_input, mode)
+            generated = []
+            async for workout in source:
+                if any(saved.day == workout.day for saved in generated):
+                    # A day the model repeats was already saved and sent
+                    logger.warning(f"Skipping repeated {workout.day} workout in stream for user_id: {user_id}")
+                    continue
+                async with checkout(owner=owner) as db:
+                    workout_id = await save_workout(user_id, workout, db)
+                await audit_writer.record(user_id, f"Generated workout for {workout.day}", workout.dict(), workout_id=workout_id)
+                generated.append(workout)
+                yield _sse("workout", {"workout_id": workout_id, **workout.dict()})
+
+            if cached is None and len(generated) == 7:
+                cache_week(user_input, generated, mode)
+            logger.info(f"Streamed and saved {len(generated)} workouts for user_id: {user_id}")
+            yield _sse("done", {"count": len(generated), "source": "cache" if cached is not None else "generated"})
+        except LLMOverloadedError as e:
+            logger.warning(f"Shed streamed workout for user_id {user_id}: {str(e)}")
+            yield _sse("error", {"detail": str(e), "status": e.status_code, "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Failed to stream workout for user_id {user_id}: {str(e)}")
+            yield _sse("error", {"detail": f"Failed to generate workout: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def _week_json(rows: List[tuple]) -> bytes:
+    # Splices each row's exercises, as text straight from the JSONB column, into the
+    # response body, so no Exercise or DailyWorkoutSchema objects are built for reads.
+    # Rows are (day, exercises_json) in created_at DESC order; days without a workout
+    # get an empty list.
+    existing_days = {day for day, _ in rows}
+    rows = rows + [(day, "[]") for day in DAYS_OF_WEEK if day not in existing_days]
+    day_order = {day: idx for idx, day in enumerate(DAYS_OF_WEEK)}
+    rows.sort(key=lambda row: day_order[row[0]])
+    return ("[" + ",".join(
+        f'{{"day":{dumps(day).decode()},"exercises":{exercises}}}' for day, exercises in rows
+    ) + "]").encode()
 
 @app.get("/workouts/week/", response_model=List[DailyWorkoutSchema])
-async def get_weekly_workout(user_id: int, db=Depends(get_db_connection)):
+async def get_weekly_workout(user_id: int, request: Request, db=Depends(get_db_connection)):
+    cursor = db.cursor()
     try:
         logger.info(f"Fetching weekly workout for user_id: {user_id}")
-        cursor = db.cursor()
-        cursor.execute(
+        now = datetime.now()
+        version = await load_workout_week_version(user_id, now, db)
+        if not version[0]:
+            logger.warning(f"No workouts found for user_id: {user_id}")
+            raise HTTPException(status_code=404, detail="No workouts found for this user in the current week")
+        etag = make_etag("workouts/week", user_id, version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        await cursor.execute(
             """
-            SELECT day, exercises
+            SELECT day, exercises::text
             FROM Workouts
             WHERE user_id = %s
             AND created_at >= %s - INTERVAL '7 days'
             ORDER BY created_at DESC
             """,
-            (user_id, datetime.now())
+            (user_id, now)
         )
-        workouts_data = cursor.fetchall()
+        workouts_data = await cursor.fetchall()
         
         if not workouts_data:
             logger.warning(f"No workouts found for user_id: {user_id}")
             raise HTTPException(status_code=404, detail="No workouts found for this user in the current week")
 
-        weekly_workouts = []
-        for workout_data in workouts_data:
-            exercises = [
-                Exercise(**ex)
-                for ex in workout_data[1]
-            ]
-            weekly_workouts.append(DailyWorkoutSchema(day=workout_data[0], exercises=exercises))
-        
-        days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        existing_days = {workout.day for workout in weekly_workouts}
-        for day in days_of_week:
-            if day not in existing_days:
-                weekly_workouts.append(DailyWorkoutSchema(day=day, exercises=[]))
-        
-        day_order = {day: idx for idx, day in enumerate(days_of_week)}
-        weekly_workouts.sort(key=lambda x: day_order[x.day])
-        
-        logger.info(f"Returning {len(weekly_workouts)} workouts for user_id: {user_id}")
-        return weekly_workouts
+        # Exercises were validated when they were saved, so the body is returned as is
+        # rather than through response_model
+        body = _week_json(workouts_data)
+        logger.info(f"Returning weekly workouts ({len(workouts_data)} saved days) for user_id: {user_id}")
+        return Response(content=body, media_type="application/json", headers=etag_headers(etag))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch weekly workout for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch weekly workout: {str(e)}")
     finally:
-        cursor.close()
+        await cursor.close()
 
 @app.post("/workouts/feedback/", response_model=FeedbackResponse)
 async def submit_workout_feedback(user_id: int, feedback: DailyWorkoutFeedbackSchema, db=Depends(get_db_connection)):
+    cursor = db.cursor()
     try:
         logger.info(f"Submitting feedback for user_id: {user_id}, day: {feedback.day}")
-        cursor = db.cursor()
-        cursor.execute(
+        await cursor.execute(
             """
             SELECT workout_id
             FROM Workouts
@@ -164,71 +281,96 @@ async def submit_workout_feedback(user_id: int, feedback: DailyWorkoutFeedbackSc
             """,
             (user_id, feedback.day, datetime.now())
         )
-        workout_data = cursor.fetchone()
+        workout_data = await cursor.fetchone()
         if not workout_data:
             logger.error(f"No workout found for user_id {user_id}, day {feedback.day}")
             raise ValueError(f"No workout found for {feedback.day} in the current week for user {user_id}")
         workout_id = workout_data[0]
 
-        await save_feedback(user_id, workout_id, feedback, db)
-        await save_conversation(user_id, f"Submitted feedback for {feedback.day}", feedback.dict(), db, workout_id=workout_id)
+        async with atomic(db):
+            await save_feedback(user_id, workout_id, feedback, db)
+            await discard_precomputed_workouts([workout_id], db)
+        await audit_writer.record(user_id, f"Submitted feedback for {feedback.day}", feedback.dict(), workout_id=workout_id)
         logger.info(f"Feedback submitted for user_id: {user_id}, workout_id: {workout_id}")
         return {"message": "Feedback submitted successfully"}
     except Exception as e:
         logger.error(f"Failed to submit feedback for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(e)}")
     finally:
-        cursor.close()
+        await cursor.close()
+
+@app.post("/workouts/feedback/batch/", response_model=BatchFeedbackResponse)
+async def submit_workout_feedback_batch(user_id: int, feedback: List[DailyWorkoutFeedbackSchema], db=Depends(get_db_connection)):
+    # Feedback for any number of days of the current week: one lookup for the
+    # workout ids, one bulk insert, one commit. Days without a workout are reported
+    # per day instead of failing the batch.
+    try:
+        logger.info(f"Submitting feedback for user_id: {user_id}, days: {[day.day for day in feedback]}")
+        workout_ids = await resolve_workout_ids(user_id, {day.day for day in feedback}, datetime.now(), db)
+        entries = [(workout_ids[day.day], day) for day in feedback if day.day in workout_ids]
+        if entries:
+            async with atomic(db):
+                await save_feedback_batch(user_id, entries, db)
+                await discard_precomputed_workouts(sorted({workout_id for workout_id, _ in entries}), db)
+        for workout_id, day in entries:
+            await audit_writer.record(user_id, f"Submitted feedback for {day.day}", day.dict(), workout_id=workout_id)
 
-@app.post("/workouts/next/", response_model=WorkoutResponse)
+        results = [
+            {
+                "day": day.day,
+                "status": "saved" if day.day in workout_ids else "no_workout",
+                "workout_id": workout_ids.get(day.day),
+                "exercises": len(day.feedback) if day.day in workout_ids else 0
+            }
+            for day in feedback
+        ]
+        logger.info(f"Feedback submitted for user_id: {user_id}, {len(entries)}/{len(feedback)} days saved")
+        return {"message": f"Feedback submitted for {len(entries)} of {len(feedback)} days", "results": results}
+    except Exception as e:
+        logger.error(f"Failed to submit feedback batch for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(e)}")
+
+@app.post("/workouts/next/", response_model=WorkoutResponse, response_class=FastJSONResponse)
 async def generate_next_workout(request: NextWorkoutRequest, db=Depends(get_db_connection)):
     try:
         user_id = request.user_id
         target_day = request.target_day
         logger.info(f"Generating next workout for user_id: {user_id}, day: {target_day}")
-
-        previous_workout = await load_previous_workout(user_id, target_day, db)
-        feedback = await load_feedback(user_id, target_day, db)
-        cursor = db.cursor()
-        cursor.execute(
-            """
-            SELECT day, exercises
-            FROM Workouts
-            WHERE user_id = %s
-            AND created_at >= %s - INTERVAL '14 days'
-            AND created_at < %s - INTERVAL '7 days'
-            ORDER BY created_at DESC
-            """,
-            (user_id, datetime.now(), datetime.now())
-        )
-        previous_week_data = cursor.fetchall()
-        previous_week = []
-        for workout_data in previous_week_data:
-            exercises = [
-                Exercise(**ex)
-                for ex in workout_data[1]
-            ]
-            previous_week.append(DailyWorkoutSchema(day=workout_data[0], exercises=exercises))
-
-        user_input = await load_user(user_id, db)
-
-        if needs_modification(feedback, previous_workout):
-            workout = await generate_next_week_workout(user_input, feedback, previous_workout, previous_week, target_day)
-        else:
-            workout = apply_slight_progression(previous_workout)
-
-        workout_id = await save_workout(user_id, workout, db)
-        await save_conversation(user_id, f"Generated next workout for {target_day}", workout.dict(), db, workout_id=workout_id)
-        logger.info(f"Generated workout_id: {workout_id} for user_id: {user_id}")
+        workout_id, workout = await build_next_workout(user_id, target_day, db, request.mode)
         return {"workout_id": workout_id, "workout": workout, "message": "Workout generated and saved"}
     except ValueError as e:
         logger.error(f"ValueError in generate_next_workout for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=404, detail=str(e))
+    except LLMOverloadedError:
+        raise
+    except LLMTimeoutError as e:
+        logger.error(f"Next workout generation timed out for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to generate next workout for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate next workout: {str(e)}")
-    finally:
-        cursor.close()
+
+@app.post("/workouts/next/week/", response_model=NextWeekResponse, response_class=FastJSONResponse)
+async def generate_next_week(request: NextWeekRequest, db=Depends(get_db_connection)):
+    try:
+        user_id = request.user_id
+        logger.info(f"Generating next week's workouts for user_id: {user_id}")
+        saved = await build_next_week(user_id, db, request.mode)
+        return {
+            "workouts": [{"workout_id": workout_id, "workout": workout} for workout_id, workout in saved],
+            "message": f"Generated and saved {len(saved)} workouts"
+        }
+    except ValueError as e:
+        logger.error(f"ValueError in generate_next_week for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=404, detail=str(e))
+    except LLMOverloadedError:
+        raise
+    except LLMTimeoutError as e:
+        logger.error(f"Next week generation timed out for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to generate next week for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate next week: {str(e)}")
 
 @app.post("/users/{user_id}/dietary-preferences", response_model=UserDietaryPreferencesResponse)
 async def create_or_update_dietary_preferences(user_id: int, preferences: UserDietaryPreferencesSchema, db=Depends(get_db_connection)):
@@ -241,46 +383,53 @@ async def create_or_update_dietary_preferences(user_id: int, preferences: UserDi
         raise HTTPException(status_code=500, detail=f"Failed to save dietary preferences: {str(e)}")
 
 @app.get("/users/{user_id}/dietary-preferences", response_model=UserDietaryPreferencesSchema)
-async def get_dietary_preferences(user_id: int, db=Depends(get_db_connection)):
+async def get_dietary_preferences(user_id: int, request: Request, db=Depends(get_db_connection)):
     try:
+        version = await load_user_dietary_preferences_version(user_id, db)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Dietary preferences not found for this user.")
+        etag = make_etag("dietary-preferences", user_id, version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
         preferences = await load_user_dietary_preferences(user_id, db)
         if not preferences:
             raise HTTPException(status_code=404, detail="Dietary preferences not found for this user.")
-        return preferences
+        body = UserDietaryPreferencesSchema.model_validate(preferences).model_dump(mode="json")
+        return FastJSONResponse(body, headers=etag_headers(etag))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to load dietary preferences for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to load dietary preferences: {str(e)}")
 
-@app.post("/nutrition/plan/", response_model=List[dict])
+@app.get("/nutrition/plan/", response_model=List[dict], response_class=FastJSONResponse)
+async def get_nutrition_plan(user_id: int, request: Request, db=Depends(get_db_connection)):
+    # Read-only counterpart of POST /nutrition/plan/: returns the current plan, never generates one
+    try:
+        version = await load_nutrition_plan_version(user_id, db)
+        if not version[0]:
+            raise HTTPException(status_code=404, detail="No nutrition plan found for this user in the current week")
+        etag = make_etag("nutrition/plan", user_id, version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        plan = await load_nutrition_plan(user_id, db)
+        if not plan:
+            raise HTTPException(status_code=404, detail="No nutrition plan found for this user in the current week")
+        return FastJSONResponse(plan, headers=etag_headers(etag))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to load nutrition plan for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to load nutrition plan: {str(e)}")
+
+@app.post("/nutrition/plan/", response_model=List[dict], response_class=FastJSONResponse)
 async def get_or_generate_nutrition_plan(request: dict, db=Depends(get_db_connection)):
     try:
         user_id = request.get('user_id')
         if not isinstance(user_id, int):
             raise ValueError(f"Invalid user_id: {user_id}")
         logger.info(f"Fetching or generating nutrition plan for user_id: {user_id}")
-
-        # Attempt to load an existing plan from the last 7 days
-        existing_plan = await load_nutrition_plan(user_id, db)
-        if existing_plan:
-            logger.info(f"Found existing nutrition plan for user_id: {user_id}. Returning it.")
-            return existing_plan
-
-        # If no recent plan, generate a new one
-        logger.info(f"No recent nutrition plan found for user_id: {user_id}. Generating a new one.")
-        user_input = await load_user(user_id, db)
-        if not user_input:
-            raise HTTPException(status_code=404, detail="User not found.")
-
-        logger.info(f"Generating new nutrition plan for user_id: {user_id}")
-        new_plan = await generate_nutrition_plan(user_id, user_input, db)
-        
-        # Save the new plan
-        await save_nutrition_plan(user_id, new_plan, db)
-        
-        await save_conversation(user_id, "Generated new nutrition plan", {"status": "success"}, db)
-        logger.info(f"Successfully generated and saved new nutrition plan for user_id: {user_id}")
-
-        return new_plan
+        return await build_nutrition_plan(user_id, db)
     except ValueError as e:
         logger.error(f"ValueError in nutrition plan generation for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -288,6 +437,35 @@ async def get_or_generate_nutrition_plan(request: dict, db=Depends(get_db_connec
         logger.error(f"Failed to get or generate nutrition plan for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process nutrition plan request: {str(e)}")
 
+@app.post("/jobs/", response_model=JobResponse, status_code=202)
+async def create_job(request: JobRequest, db=Depends(get_db_connection)):
+    try:
+        if request.kind == "next_workout" and not request.target_day:
+            raise ValueError("target_day is required for next_workout jobs")
+        payload = {"mode": request.mode}
+        if request.target_day:
+            payload["target_day"] = request.target_day
+        job_id = await enqueue_job(request.kind, request.user_id, payload, db)
+        logger.info(f"Enqueued {request.kind} job {job_id} for user_id: {request.user_id}")
+        return {"job_id": job_id, "status": "queued", "message": "Job queued"}
+    except ValueError as e:
+        logger.error(f"ValueError in create_job: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to enqueue {request.kind} job for user_id {request.user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to enqueue job: {str(e)}")
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: int, db=Depends(get_db_connection)):
+    try:
+        job = await load_job(job_id, db)
+    except Exception as e:
+        logger.error(f"Failed to load job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to load job: {str(e)}")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 
 if __name__ == "__main__":
     import uvicorn
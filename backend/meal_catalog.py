@@ -0,0 +1,140 @@
+import asyncio
+import copy
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from schemas import MealSchema
+
+logger = logging.getLogger(__name__)
+
+# How often the catalog checks Meals for changes; between checks no query is made
+MEAL_CATALOG_CHECK_INTERVAL = float(os.getenv("MEAL_CATALOG_CHECK_INTERVAL", "60"))
+
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack"]
+
+# Process-wide copy of the Meals table, indexed by meal_type. Each meal's dietary
+# tags are held as a bitmask over the catalog's tag vocabulary, so preference and
+# allergy filters are integer AND operations instead of JSONB queries. Allergies are
+# matched against the same tags, as the old `dietary_tags ?| allergies` filter did.
+# Per type, meal_ids and nutrients (calories, protein_g, carbs_g, fat_g) are kept as
+# arrays aligned with by_type for the meal optimizer.
+class MealCatalog:
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.tag_bits: Dict[str, int] = {}
+        self.by_type: Dict[str, List[MealSchema]] = {meal_type: [] for meal_type in MEAL_TYPES}
+        self.masks_by_type: Dict[str, List[int]] = {meal_type: [] for meal_type in MEAL_TYPES}
+        self.ids_by_type: Dict[str, np.ndarray] = {meal_type: np.empty(0, dtype=np.int64) for meal_type in MEAL_TYPES}
+        self.nutrients_by_type: Dict[str, np.ndarray] = {meal_type: np.empty((0, 4)) for meal_type in MEAL_TYPES}
+        self.version = None
+        self.loaded_at = None
+        self.reloads = 0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        # Forces a version check on the next ensure_fresh
+        self._checked_at = 0.0
+
+    async def ensure_fresh(self, db):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+            cursor = db.cursor()
+            # Row count catches deletes, the newest xmin catches inserts and updates
+            await cursor.execute("SELECT COUNT(*), COALESCE(MAX(xmin::text::bigint), 0) FROM Meals")
+            version = tuple(await cursor.fetchone())
+            if version != self.version:
+                await self._load(db)
+                self.version = version
+            self._checked_at = time.monotonic()
+
+    async def _load(self, db):
+        cursor = db.cursor()
+        await cursor.execute(
+            """
+            SELECT meal_id, name, meal_type, calories, protein_g, carbs_g, fat_g, dietary_tags
+            FROM Meals
+            """
+        )
+        tag_bits = {}
+        by_type = {meal_type: [] for meal_type in MEAL_TYPES}
+        masks_by_type = {meal_type: [] for meal_type in MEAL_TYPES}
+        for row in await cursor.fetchall():
+            tags = row[7] or []
+            mask = 0
+            for tag in tags:
+                mask |= 1 << tag_bits.setdefault(tag, len(tag_bits))
+            meal = MealSchema(
+                meal_id=row[0], name=row[1], meal_type=row[2], foods=[],
+                calories=row[3], protein_g=row[4], carbs_g=row[5], fat_g=row[6],
+                dietary_tags=tags
+            )
+            by_type.setdefault(meal.meal_type, []).append(meal)
+            masks_by_type.setdefault(meal.meal_type, []).append(mask)
+        ids_by_type = {
+            meal_type: np.array([meal.meal_id for meal in meals], dtype=np.int64) for meal_type, meals in by_type.items()
+        }
+        nutrients_by_type = {
+            meal_type: np.array(
+                [[meal.calories, meal.protein_g, meal.carbs_g, meal.fat_g] for meal in meals], dtype=np.float64
+            ).reshape(-1, 4)
+            for meal_type, meals in by_type.items()
+        }
+        # Swap in the new index whole so readers never see a half-built one
+        self.tag_bits, self.by_type, self.masks_by_type = tag_bits, by_type, masks_by_type
+        self.ids_by_type, self.nutrients_by_type = ids_by_type, nutrients_by_type
+        self.loaded_at = time.time()
+        self.reloads += 1
+        logger.info(f"Loaded meal catalog: {sum(len(meals) for meals in by_type.values())} meals, {len(tag_bits)} tags")
+
+    def snapshot(self) -> "MealCatalog":
+        # _load swaps whole containers rather than mutating them, so a shallow copy is a
+        # consistent view that a reload cannot change under a caller in another thread
+        return copy.copy(self)
+
+    def _mask(self, tags: List[str]) -> int:
+        mask = 0
+        for tag in tags:
+            if tag in self.tag_bits:
+                mask |= 1 << self.tag_bits[tag]
+        return mask
+
+    def eligible(self, dietary_preferences: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+        # Positions, per type, of the meals that satisfy the user's diet and avoid their allergies
+        required = []
+        allergies = []
+        if dietary_preferences:
+            if dietary_preferences.get('is_vegan'):
+                required = ['vegan']
+            elif dietary_preferences.get('is_vegetarian'):
+                required = ['vegetarian']
+            allergies = dietary_preferences.get('allergies') or []
+
+        if any(tag not in self.tag_bits for tag in required):
+            # No meal carries the required tag
+            return {meal_type: np.empty(0, dtype=np.int64) for meal_type in self.by_type}
+        required_mask = self._mask(required)
+        excluded_mask = self._mask(allergies)
+        return {
+            meal_type: np.array([
+                position for position, mask in enumerate(masks)
+                if mask & required_mask == required_mask and not mask & excluded_mask
+            ], dtype=np.int64)
+            for meal_type, masks in self.masks_by_type.items()
+        }
+
+    def stats(self) -> dict:
+        return {
+            "meals": sum(len(meals) for meals in self.by_type.values()),
+            "by_type": {meal_type: len(meals) for meal_type, meals in self.by_type.items()},
+            "tags": len(self.tag_bits),
+            "reloads": self.reloads,
+            "loaded_at": self.loaded_at
+        }
+
+meal_catalog = MealCatalog(MEAL_CATALOG_CHECK_INTERVAL)
@@ -0,0 +1,116 @@
+import os
+from typing import Dict, List, Optional, Set
+import numpy as np
+from meal_catalog import MealCatalog, MEAL_TYPES
+
+# Share of the day's calories each meal type is expected to cover, used to shortlist
+# candidates before combinations are scored
+SLOT_SHARES = {"breakfast": 0.25, "lunch": 0.35, "dinner": 0.3, "snack": 0.1}
+# Meals kept per type for the combination search; 24^4 combinations score in well
+# under a second however large the catalog is
+CANDIDATES_PER_TYPE = int(os.getenv("MEAL_OPTIMIZER_CANDIDATES", "24"))
+# Breakfasts scored per batch, which bounds the size of the combination arrays
+BATCH_SIZE = 8
+# Random noise added to shortlist scores so near-equal meals rotate between plans
+JITTER = 0.05
+# kcal per gram of protein, carbs and fat
+KCAL_PER_GRAM = np.array([4.0, 4.0, 9.0])
+# Bounds on how far a meal's portion can be scaled
+MIN_PORTION, MAX_PORTION = 0.5, 2.0
+
+def _macro_error(nutrients: np.ndarray, ratios: np.ndarray) -> np.ndarray:
+    # L1 distance between the share of calories from protein/carbs/fat and the target ratios
+    macro_kcal = nutrients[..., 1:4] * KCAL_PER_GRAM
+    total = macro_kcal.sum(axis=-1, keepdims=True)
+    shares = np.divide(macro_kcal, total, out=np.zeros_like(macro_kcal), where=total > 0)
+    return np.abs(shares - ratios).sum(axis=-1)
+
+def _combination_scores(totals: np.ndarray, daily_calories: float, ratios: np.ndarray) -> np.ndarray:
+    calories = totals[..., 0]
+    multiplier = np.clip(np.divide(daily_calories, calories, out=np.full_like(calories, MAX_PORTION), where=calories > 0), MIN_PORTION, MAX_PORTION)
+    calorie_error = np.abs(calories * multiplier - daily_calories) / daily_calories
+    return calorie_error + _macro_error(totals, ratios)
+
+def _shortlist(catalog: MealCatalog, meal_type: str, positions: np.ndarray, daily_calories: float, ratios: np.ndarray, excluded_meal_ids: Set[int], rng: np.random.Generator) -> np.ndarray:
+    if excluded_meal_ids and len(positions):
+        positions = positions[~np.isin(catalog.ids_by_type[meal_type][positions], list(excluded_meal_ids))]
+    if len(positions) <= CANDIDATES_PER_TYPE:
+        return positions
+    nutrients = catalog.nutrients_by_type[meal_type][positions]
+    slot_calories = daily_calories * SLOT_SHARES.get(meal_type, 0.25)
+    scores = np.abs(nutrients[:, 0] - slot_calories) / slot_calories + _macro_error(nutrients, ratios)
+    scores += rng.random(len(scores)) * JITTER
+    return positions[np.argpartition(scores, CANDIDATES_PER_TYPE)[:CANDIDATES_PER_TYPE]]
+
+def _score_all(shortlist_nutrients: List[np.ndarray], daily_calories: float, ratios: np.ndarray) -> np.ndarray:
+    # Scores every combination, one batch of first-type meals at a time, in the
+    # row-major order of the combination grid
+    first, rest = shortlist_nutrients[0], shortlist_nutrients[1:]
+    rest_totals = np.zeros((1, 4))
+    for nutrients in rest:
+        rest_totals = (rest_totals[:, None, :] + nutrients[None, :, :]).reshape(-1, 4)
+    scores = []
+    for start in range(0, len(first), BATCH_SIZE):
+        totals = first[start:start + BATCH_SIZE, None, :] + rest_totals[None, :, :]
+        scores.append(_combination_scores(totals, daily_calories, ratios).ravel())
+    return np.concatenate(scores)
+
+def plan_week_meals(
+    catalog: MealCatalog,
+    eligible: Dict[str, np.ndarray],
+    daily_calories: float,
+    macro_ratios: dict,
+    days: int,
+    excluded_meal_ids: Optional[Set[int]] = None,
+    rng: Optional[np.random.Generator] = None
+) -> List[List[dict]]:
+    # Picks one meal per type for each day: the best-scoring combinations against
+    # the calorie target and macro ratios, with no meal used twice in the week while
+    # unused candidates remain. Meal types with no eligible meals are left out.
+    rng = rng or np.random.default_rng()
+    ratios = np.array([macro_ratios["protein"], macro_ratios["carbs"], macro_ratios["fat"]])
+    if daily_calories <= 0:
+        return [[] for _ in range(days)]
+
+    shortlists = {}
+    for meal_type in MEAL_TYPES:
+        positions = _shortlist(catalog, meal_type, eligible.get(meal_type, np.empty(0, dtype=np.int64)), daily_calories, ratios, excluded_meal_ids or set(), rng)
+        if len(positions):
+            shortlists[meal_type] = positions
+    if not shortlists:
+        return [[] for _ in range(days)]
+
+    meal_types = list(shortlists)
+    shortlist_nutrients = [catalog.nutrients_by_type[meal_type][shortlists[meal_type]] for meal_type in meal_types]
+    scores = _score_all(shortlist_nutrients, daily_calories, ratios)
+    order = np.argsort(scores, kind="stable")
+    # Row k holds the per-type shortlist indices of the k-th best combination
+    combinations = np.stack(np.unravel_index(order, [len(nutrients) for nutrients in shortlist_nutrients]), axis=1)
+
+    available = np.ones(len(combinations), dtype=bool)
+    week = []
+    for _ in range(days):
+        # Once every non-repeating combination is used up, repeat the best one
+        best = int(np.argmax(available)) if available.any() else 0
+        picked = combinations[best]
+        available &= (combinations != picked).all(axis=1)
+
+        totals = sum(nutrients[index] for nutrients, index in zip(shortlist_nutrients, picked))
+        # Plain floats: the plan is stored as JSONB and returned as JSON, neither of
+        # which takes numpy scalars
+        multiplier = float(max(MIN_PORTION, min(MAX_PORTION, daily_calories / totals[0]))) if totals[0] > 0 else 1.0
+        meals = []
+        for meal_type, index in zip(meal_types, picked):
+            meal = catalog.by_type[meal_type][shortlists[meal_type][index]]
+            meals.append({
+                "meal_id": int(meal.meal_id),
+                "name": meal.name,
+                "meal_type": meal.meal_type,
+                "calories": float(round(meal.calories * multiplier, 2)),
+                "protein_g": float(round(meal.protein_g * multiplier, 2)),
+                "carbs_g": float(round(meal.carbs_g * multiplier, 2)),
+                "fat_g": float(round(meal.fat_g * multiplier, 2)),
+                "portion_size_multiplier": round(multiplier, 2)
+            })
+        week.append(meals)
+    return week
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import List
+from psycopg import AsyncClientCursor
+from db import atomic, checkout, open_pool, close_pool
+from db_ops import NEXT_WORKOUT_CONTEXT_QUERY, NEXT_WEEK_CONTEXT_QUERY
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+# Arbitrary key for the advisory lock that keeps concurrent app starts from migrating twice
+MIGRATION_LOCK_KEY = 720452
+
+# Migrations are numbered SQL files (NNNN_name.sql), applied in order, each in its
+# own transaction, and recorded in schema_migrations so every version runs once.
+
+def _migration_files() -> List[tuple]:
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = re.match(r"(\d+)_(.+)\.sql$", path.name)
+        if not match:
+            raise ValueError(f"Badly named migration file: {path.name}")
+        migrations.append((int(match.group(1)), match.group(2), path))
+    return migrations
+
+async def run_migrations(db) -> List[int]:
+    cursor = db.cursor()
+    await cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    applied_now = []
+    try:
+        await cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        await cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in await cursor.fetchall()}
+        for version, name, path in _migration_files():
+            if version in applied:
+                continue
+            logger.info(f"Applying migration {version:04d}_{name}")
+            async with atomic(db):
+                await cursor.execute(path.read_text())
+                await cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+            applied_now.append(version)
+    finally:
+        await cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    return applied_now
+
+# The per-request queries that must be served by an index, with sample parameters.
+# Keep these in step with the queries in db_ops.py and main.py.
+_NOW = datetime(2024, 1, 8)
+HOT_QUERIES = {
+    "load_user": (
+        "SELECT name FROM Users WHERE user_id = %s",
+        (1,)
+    ),
+    "load_recent_workouts": (
+        "SELECT day, exercises FROM Workouts WHERE user_id = %s AND created_at >= %s - %s * INTERVAL '1 day' ORDER BY created_at DESC",
+        (1, _NOW, 7)
+    ),
+    "load_previous_workout": (
+        "SELECT day, exercises FROM Workouts WHERE user_id = %s AND day = %s "
+        "AND created_at >= %s - INTERVAL '14 days' AND created_at < %s - INTERVAL '7 days' ORDER BY created_at DESC LIMIT 1",
+        (1, "Monday", _NOW, _NOW)
+    ),
+    "load_previous_week": (
+        "SELECT day, exercises FROM Workouts WHERE user_id = %s "
+        "AND created_at >= %s - INTERVAL '14 days' AND created_at < %s - INTERVAL '7 days' ORDER BY created_at DESC",
+        (1, _NOW, _NOW)
+    ),
+    "load_feedback": (
+        "SELECT exercise_name, sets_completed, reps_completed, difficulty, notes, soreness_level FROM Feedback WHERE workout_id = %s",
+        (1,)
+    ),
+    "weekly_workout": (
+        "SELECT day, exercises FROM Workouts WHERE user_id = %s AND created_at >= %s - INTERVAL '7 days' ORDER BY created_at DESC",
+        (1, _NOW)
+    ),
+    "submit_feedback_lookup": (
+        "SELECT workout_id FROM Workouts WHERE user_id = %s AND day = %s AND created_at >= %s - INTERVAL '7 days' ORDER BY created_at DESC LIMIT 1",
+        (1, "Monday", _NOW)
+    ),
+    "load_user_dietary_preferences": (
+        "SELECT * FROM UserDietaryPreferences WHERE user_id = %s",
+        (1,)
+    ),
+    "load_nutrition_plan": (
+        "SELECT day, meals FROM NutritionPlans WHERE user_id = %s AND created_at >= NOW() - INTERVAL '7 days' ORDER BY created_at DESC, day ASC",
+        (1,)
+    ),
+    "take_precomputed_workout": (
+        "SELECT user_id, day, source_workout_id FROM PrecomputedWorkouts "
+        "WHERE user_id = %s AND day = %s AND consumed_at IS NULL AND expires_at > NOW() ORDER BY created_at DESC LIMIT 1",
+        (1, "Monday")
+    ),
+    "discard_precomputed_workouts": (
+        "SELECT 1 FROM PrecomputedWorkouts WHERE source_workout_id = ANY(%s)",
+        ([1, 2],)
+    ),
+    "discard_user_precomputed_workouts": (
+        "SELECT 1 FROM PrecomputedWorkouts WHERE user_id = %s AND day = ANY(%s) AND consumed_at IS NULL",
+        (1, ["Monday", "Tuesday"])
+    ),
+    "resolve_workout_ids": (
+        "SELECT DISTINCT ON (day) day, workout_id FROM Workouts WHERE user_id = %s AND day = ANY(%s) "
+        "AND created_at >= %s - INTERVAL '7 days' ORDER BY day, created_at DESC",
+        (1, ["Monday", "Tuesday"], _NOW)
+    ),
+    "load_workout_week_version": (
+        "SELECT COUNT(*), COALESCE(MAX(xmin::text::bigint), 0) FROM Workouts WHERE user_id = %s AND created_at >= %s - INTERVAL '7 days'",
+        (1, _NOW)
+    ),
+    "load_nutrition_plan_version": (
+        "SELECT COUNT(*), COALESCE(MAX(xmin::text::bigint), 0) FROM NutritionPlans WHERE user_id = %s AND created_at >= NOW() - INTERVAL '7 days'",
+        (1,)
+    ),
+    "load_user_dietary_preferences_version": (
+        "SELECT xmin::text FROM UserDietaryPreferences WHERE user_id = %s",
+        (1,)
+    ),
+    "load_next_workout_context": (
+        NEXT_WORKOUT_CONTEXT_QUERY,
+        {"user_id": 1, "day": "Monday", "now": _NOW}
+    ),
+    "load_next_week_context": (
+        NEXT_WEEK_CONTEXT_QUERY,
+        {"user_id": 1, "now": _NOW}
+    ),
+    "claim_job": (
+        "SELECT job_id FROM GenerationJobs WHERE status = 'queued' AND run_after <= NOW() ORDER BY created_at LIMIT 1",
+        ()
+    ),
+    "requeue_stale_jobs": (
+        "SELECT job_id FROM GenerationJobs WHERE status = 'running' AND updated_at < NOW() - %s * INTERVAL '1 second'",
+        (120,)
+    ),
+}
+
+def _seq_scans(plan: dict) -> List[str]:
+    found = [plan.get("Relation Name", "?")] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+async def check_query_plans(db) -> List[str]:
+    # With enable_seqscan off the planner only picks a sequential scan when no index
+    # can serve the query, so the result does not depend on how much data there is.
+    # EXPLAIN cannot take bind parameters, hence the client-side binding cursor.
+    failures = []
+    async with atomic(db):
+        cursor = AsyncClientCursor(db)
+        await cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, (query, params) in HOT_QUERIES.items():
+            await cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = (await cursor.fetchone())[0][0]["Plan"]
+            for table in _seq_scans(plan):
+                failures.append(f"{name}: sequential scan on {table}")
+    return failures
+
+async def _main(args: List[str]) -> int:
+    await open_pool()
+    try:
+        async with checkout(owner="migrate") as db:
+            applied = await run_migrations(db)
+            print(f"Applied migrations: {applied or 'none'}")
+            if "--check" in args:
+                failures = await check_query_plans(db)
+                for failure in failures:
+                    print(failure)
+                print(f"{len(HOT_QUERIES) - len({f.split(':')[0] for f in failures})}/{len(HOT_QUERIES)} hot queries use an index")
+                return 1 if failures else 0
+    finally:
+        await close_pool()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
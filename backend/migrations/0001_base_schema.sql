@@ -0,0 +1,75 @@
+-- Core tables. IF NOT EXISTS lets databases created before migrations adopt this
+-- version without changes.
+
+CREATE TABLE IF NOT EXISTS Users (
+    user_id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER,
+    height_cm REAL NOT NULL,
+    weight_kg REAL NOT NULL,
+    fat_percentage REAL,
+    experience_level INTEGER,
+    equipment JSONB NOT NULL DEFAULT '[]',
+    fitness_goal TEXT,
+    gender TEXT NOT NULL,
+    gym_strength JSONB,
+    home_strength JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS Workouts (
+    workout_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES Users (user_id),
+    day TEXT NOT NULL,
+    exercises JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS Feedback (
+    feedback_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES Users (user_id),
+    workout_id INTEGER NOT NULL REFERENCES Workouts (workout_id),
+    exercise_name TEXT NOT NULL,
+    sets_completed INTEGER NOT NULL,
+    reps_completed TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    notes TEXT,
+    soreness_level INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS UserDietaryPreferences (
+    user_id INTEGER PRIMARY KEY REFERENCES Users (user_id),
+    allergies TEXT[] NOT NULL DEFAULT '{}',
+    is_vegan BOOLEAN NOT NULL DEFAULT FALSE,
+    is_vegetarian BOOLEAN NOT NULL DEFAULT FALSE,
+    other_restrictions TEXT
+);
+
+CREATE TABLE IF NOT EXISTS Meals (
+    meal_id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    meal_type TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein_g REAL NOT NULL,
+    carbs_g REAL NOT NULL,
+    fat_g REAL NOT NULL,
+    dietary_tags JSONB NOT NULL DEFAULT '[]'
+);
+
+CREATE TABLE IF NOT EXISTS NutritionPlans (
+    plan_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES Users (user_id),
+    day TEXT NOT NULL,
+    meals JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS Conversations (
+    conversation_id SERIAL PRIMARY KEY,
+    user_id INTEGER,
+    workout_id INTEGER,
+    action TEXT NOT NULL,
+    data JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
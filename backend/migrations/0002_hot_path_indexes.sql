@@ -0,0 +1,14 @@
+-- Indexes behind the per-request queries in db_ops.py and main.py. check_query_plans
+-- in migrate.py fails if any of those queries stops using them.
+
+-- load_previous_workout, load_feedback and the feedback endpoint: one user's day, newest first
+CREATE INDEX IF NOT EXISTS idx_workouts_user_day_created ON Workouts (user_id, day, created_at DESC);
+
+-- load_recent_workouts, load_previous_week and /workouts/week/: one user's date range
+CREATE INDEX IF NOT EXISTS idx_workouts_user_created ON Workouts (user_id, created_at DESC);
+
+-- load_feedback: the feedback rows of one workout
+CREATE INDEX IF NOT EXISTS idx_feedback_workout ON Feedback (workout_id);
+
+-- load_nutrition_plan and save_nutrition_plan's DELETE
+CREATE INDEX IF NOT EXISTS idx_nutritionplans_user_created ON NutritionPlans (user_id, created_at DESC);
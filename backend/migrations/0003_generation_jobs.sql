@@ -0,0 +1,22 @@
+-- Queue of background generation jobs (jobs.py). Workers claim queued rows, record
+-- progress and attempts, and store the result or error for clients polling /jobs/{job_id}.
+
+CREATE TABLE IF NOT EXISTS GenerationJobs (
+    job_id SERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id INTEGER,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_generationjobs_queued ON GenerationJobs (created_at) WHERE status = 'queued';
+
+-- _requeue_stale scans running jobs at startup
+CREATE INDEX IF NOT EXISTS idx_generationjobs_running ON GenerationJobs (started_at) WHERE status = 'running';
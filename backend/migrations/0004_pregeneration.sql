@@ -0,0 +1,29 @@
+-- Nightly pre-generation (pregenerate.py). PrecomputedWorkouts holds next workouts
+-- generated ahead of time until they are served or expire; PregenerationRuns records
+-- each batch's progress so an interrupted run can resume from its checkpoint.
+
+CREATE TABLE IF NOT EXISTS PrecomputedWorkouts (
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    source_workout_id INTEGER NOT NULL,
+    exercises JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL,
+    consumed_at TIMESTAMP,
+    PRIMARY KEY (user_id, day, source_workout_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_precomputedworkouts_source ON PrecomputedWorkouts (source_workout_id);
+
+CREATE TABLE IF NOT EXISTS PregenerationRuns (
+    run_id SERIAL PRIMARY KEY,
+    run_date DATE NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'running',
+    last_user_id INTEGER NOT NULL DEFAULT 0,
+    users_done INTEGER NOT NULL DEFAULT 0,
+    generated INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
@@ -0,0 +1,10 @@
+-- Job leases and deferred retries (jobs.py). Workers bump updated_at while a job runs,
+-- and the periodic sweep requeues running jobs whose heartbeat has stopped. Jobs shed
+-- by the model admission controller are requeued to run again after run_after.
+
+ALTER TABLE GenerationJobs ADD COLUMN IF NOT EXISTS run_after TIMESTAMP NOT NULL DEFAULT NOW();
+ALTER TABLE GenerationJobs ADD COLUMN IF NOT EXISTS deferrals INTEGER NOT NULL DEFAULT 0;
+
+-- The sweep looks for expired leases rather than old start times
+DROP INDEX IF EXISTS idx_generationjobs_running;
+CREATE INDEX IF NOT EXISTS idx_generationjobs_lease ON GenerationJobs (updated_at) WHERE status = 'running';
@@ -1,6 +1,11 @@
-from typing import Literal, Optional, Union, List, Dict, Any
+from typing import Literal, Optional, Union, List, Dict, Any, Tuple
+
+# Thousands of these are built per request (one per exercise or feedback row), so
+# they declare __slots__ instead of carrying a per-instance __dict__.
 
 class GymStrength:
+    __slots__ = ("bench_press_max", "squat_max", "deadlift_max")
+
     def __init__(self, bench_press_max: float, squat_max: float, deadlift_max: float):
         self.bench_press_max = bench_press_max
         self.squat_max = squat_max
@@ -14,6 +19,8 @@ class GymStrength:
         }
 
 class HomeStrength:
+    __slots__ = ("pushups_reps", "pullups_reps", "bodyweight_squats_reps")
+
     def __init__(self, pushups_reps: int, pullups_reps: int, bodyweight_squats_reps: int):
         self.pushups_reps = pushups_reps
         self.pullups_reps = pullups_reps
@@ -27,6 +34,11 @@ class HomeStrength:
         }
 
 class UserFitnessInput:
+    __slots__ = (
+        "name", "age", "height_cm", "weight_kg", "fat_percentage", "experience_level",
+        "equipment", "fitness_goal", "gender", "gym_strength", "home_strength"
+    )
+
     def __init__(
         self,
         name: str,
@@ -69,6 +81,8 @@ class UserFitnessInput:
         }
 
 class Exercise:
+    __slots__ = ("name", "sets", "reps", "weight")
+
     def __init__(
         self,
         name: str,
@@ -90,6 +104,8 @@ class Exercise:
         }
 
 class DailyWorkout:
+    __slots__ = ("day", "exercises")
+
     def __init__(self, day: str, exercises: List[Exercise]):
         self.day = day
         self.exercises = exercises
@@ -101,6 +117,8 @@ class DailyWorkout:
         }
 
 class ExerciseFeedback:
+    __slots__ = ("name", "sets_completed", "reps_completed", "difficulty", "notes", "soreness_level")
+
     def __init__(
         self,
         name: str,
@@ -128,6 +146,8 @@ class ExerciseFeedback:
         }
 
 class DailyWorkoutFeedback:
+    __slots__ = ("day", "feedback")
+
     def __init__(self, day: str, feedback: List[ExerciseFeedback]):
         self.day = day
         self.feedback = feedback
@@ -136,4 +156,34 @@ class DailyWorkoutFeedback:
         return {
             "day": self.day,
             "feedback": [fb.dict() for fb in self.feedback]
-        }
\ No newline at end of file
+        }
+
+class NextWorkoutContext:
+    # Everything next-week generation needs for one target day, loaded together
+    __slots__ = ("user_input", "previous_workout", "feedback", "previous_week")
+
+    def __init__(
+        self,
+        user_input: UserFitnessInput,
+        previous_workout: DailyWorkout,
+        feedback: DailyWorkoutFeedback,
+        previous_week: List[DailyWorkout]
+    ):
+        self.user_input = user_input
+        self.previous_workout = previous_workout
+        self.feedback = feedback
+        self.previous_week = previous_week
+
+class NextWeekContext:
+    # The same for every day of last week that has a workout, as (workout, feedback) pairs
+    __slots__ = ("user_input", "days", "previous_week")
+
+    def __init__(
+        self,
+        user_input: UserFitnessInput,
+        days: List[Tuple[DailyWorkout, DailyWorkoutFeedback]],
+        previous_week: List[DailyWorkout]
+    ):
+        self.user_input = user_input
+        self.days = days
+        self.previous_week = previous_week
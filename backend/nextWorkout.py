@@ -1,7 +1,7 @@
 import json
 from datetime import datetime
 from db_ops import load_user, load_previous_workout, load_feedback, save_workout
-from workout_generator import generate_next_week_workout, apply_slight_progression, needs_modification
+from workout_generator import generate_next_week_workout, apply_slight_progression, requires_substitution
 
 def process_next_week_workout(user_id: int):
     try:
@@ -10,9 +10,9 @@ def process_next_week_workout(user_id: int):
         feedback = load_feedback(user_id, target_day=target_day)
         previous_workout = load_previous_workout(user_id, target_day=target_day)
 
-        if not needs_modification(feedback, previous_workout):
+        if not requires_substitution(feedback):
             print(f"\nNo modifications needed for {target_day}. Reusing previous workout with slight progression:")
-            adjusted_workout = apply_slight_progression(previous_workout)
+            adjusted_workout = apply_slight_progression(previous_workout, feedback)
             print(json.dumps(adjusted_workout.model_dump(), indent=2))
 
             workout_id = save_workout(user_id, adjusted_workout)
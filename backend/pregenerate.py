@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from psycopg.rows import dict_row
+from db import checkout, open_pool, close_pool
+from admission import llm_priority
+from db_ops import load_next_workout_context, save_precomputed_workout
+from migrate import run_migrations
+from generation import compute_next_workout_from_context
+
+logger = logging.getLogger(__name__)
+
+PREGEN_ENABLED = os.getenv("PREGEN_ENABLED", "true").lower() == "true"
+PREGEN_HOUR = int(os.getenv("PREGEN_HOUR", "3"))
+PREGEN_CONCURRENCY = int(os.getenv("PREGEN_CONCURRENCY", "4"))
+# Precomputed workouts are only served for this long after the batch produced them
+PREGEN_TTL_HOURS = float(os.getenv("PREGEN_TTL_HOURS", "36"))
+# Arbitrary key for the advisory lock that keeps the batch to one process at a time
+PREGEN_LOCK_KEY = 720451
+
+async def _start_or_resume_run(db, resume_only: bool = False) -> Optional[dict]:
+    # An unfinished run is resumed whatever its date, so a batch cut short by a restart
+    # picks up at its checkpoint instead of being abandoned at midnight. Older unfinished
+    # runs are superseded by the latest one.
+    cursor = db.cursor(row_factory=dict_row)
+    await cursor.execute(
+        """
+        SELECT run_id, run_date, status, last_user_id, users_done, generated, skipped, failed, started_at
+        FROM PregenerationRuns
+        WHERE status = 'running'
+        ORDER BY run_date DESC
+        LIMIT 1
+        """
+    )
+    run = await cursor.fetchone()
+    if run is not None:
+        await cursor.execute(
+            "UPDATE PregenerationRuns SET status = 'abandoned' WHERE status = 'running' AND run_date < %s",
+            (run["run_date"],)
+        )
+        return run
+    if resume_only:
+        return None
+
+    await cursor.execute(
+        """
+        INSERT INTO PregenerationRuns (run_date)
+        VALUES (CURRENT_DATE)
+        ON CONFLICT (run_date) DO UPDATE SET run_date = EXCLUDED.run_date
+        RETURNING run_id, run_date, status, last_user_id, users_done, generated, skipped, failed, started_at
+        """
+    )
+    run = await cursor.fetchone()
+    return None if run["status"] == "done" else run
+
+async def _next_users(after_user_id: int, limit: int, now: datetime, db) -> dict:
+    # Last week's workouts that have feedback, grouped by user, in user_id order so the
+    # run can checkpoint on the last finished user. The latest workout per day is picked
+    # first so the source matches what load_previous_workout/load_feedback will use.
+    # "Last week" is relative to when the run started, so a resumed run keeps its window.
+    cursor = db.cursor()
+    await cursor.execute(
+        """
+        WITH users_page AS (
+            SELECT DISTINCT user_id
+            FROM Workouts
+            WHERE user_id > %s
+            AND created_at >= %s - INTERVAL '14 days'
+            AND created_at < %s - INTERVAL '7 days'
+            ORDER BY user_id
+            LIMIT %s
+        ),
+        latest AS (
+            SELECT DISTINCT ON (w.user_id, w.day) w.user_id, w.day, w.workout_id
+            FROM Workouts w
+            JOIN users_page u ON u.user_id = w.user_id
+            WHERE w.created_at >= %s - INTERVAL '14 days'
+            AND w.created_at < %s - INTERVAL '7 days'
+            ORDER BY w.user_id, w.day, w.created_at DESC
+        )
+        SELECT u.user_id, l.day, l.workout_id
+        FROM users_page u
+        LEFT JOIN latest l ON l.user_id = u.user_id
+            AND EXISTS (SELECT 1 FROM Feedback f WHERE f.workout_id = l.workout_id)
+            AND NOT EXISTS (
+                SELECT 1 FROM PrecomputedWorkouts p
+                WHERE p.source_workout_id = l.workout_id AND p.expires_at > NOW()
+            )
+        ORDER BY u.user_id
+        """,
+        (after_user_id, now, now, limit, now, now)
+    )
+    users = {}
+    for user_id, day, workout_id in await cursor.fetchall():
+        days = users.setdefault(user_id, [])
+        if day is not None:
+            days.append((day, workout_id))
+    return users
+
+async def _checkpoint(run: dict, db, status: str = "running"):
+    cursor = db.cursor()
+    await cursor.execute(
+        """
+        UPDATE PregenerationRuns
+        SET status = %s, last_user_id = %s, users_done = %s, generated = %s, skipped = %s, failed = %s,
+            finished_at = CASE WHEN %s = 'done' THEN NOW() ELSE NULL END
+        WHERE run_id = %s
+        """,
+        (status, run["last_user_id"], run["users_done"], run["generated"], run["skipped"], run["failed"], status, run["run_id"])
+    )
+
+async def _pregenerate_user(user_id: int, days: list, semaphore: asyncio.Semaphore) -> tuple:
+    # Runs in its own task under gather, so this only lowers the batch's model calls
+    llm_priority.set("background")
+    generated = failed = 0
+    owner = f"pregeneration user {user_id}"
+    async with semaphore:
+        for day, source_workout_id in days:
+            try:
+                # No connection is held while the model generates the workout
+                async with checkout(owner=owner) as db:
+                    context = await load_next_workout_context(user_id, day, db)
+                workout = await compute_next_workout_from_context(context, day)
+                async with checkout(owner=owner) as db:
+                    await save_precomputed_workout(user_id, source_workout_id, workout, PREGEN_TTL_HOURS, db)
+                generated += 1
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to pregenerate {day} workout for user_id {user_id}: {str(e)}")
+    return generated, failed
+
+async def _execute_run(run: dict, concurrency: int, db) -> dict:
+    if run["last_user_id"]:
+        logger.info(f"Resuming pregeneration run {run['run_id']} ({run['run_date']}) after user_id {run['last_user_id']}")
+
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(concurrency)
+    while True:
+        users = await _next_users(run["last_user_id"], concurrency * 4, run["started_at"], db)
+        if not users:
+            break
+        results = await asyncio.gather(*[
+            _pregenerate_user(user_id, days, semaphore) for user_id, days in users.items()
+        ])
+        for (user_id, days), (generated, failed) in zip(users.items(), results):
+            run["generated"] += generated
+            run["failed"] += failed
+            if not days:
+                run["skipped"] += 1
+        run["users_done"] += len(users)
+        run["last_user_id"] = max(users)
+        await _checkpoint(run, db)
+
+    await _checkpoint(run, db, status="done")
+
+    elapsed = time.monotonic() - started
+    report = {
+        "run_id": run["run_id"],
+        "run_date": run["run_date"].isoformat(),
+        "users": run["users_done"],
+        "generated": run["generated"],
+        "skipped_users": run["skipped"],
+        "failed": run["failed"],
+        "elapsed_s": round(elapsed, 2),
+        "workouts_per_s": round(run["generated"] / elapsed, 2) if elapsed > 0 else 0.0
+    }
+    logger.info(f"Pregeneration run finished: {report}")
+    return report
+
+async def run_pregeneration(concurrency: int = PREGEN_CONCURRENCY, resume_only: bool = False) -> Optional[dict]:
+    # Finishes any interrupted run first, then today's (unless resume_only). The session
+    # advisory lock ties the batch to this one connection for its whole length; the
+    # per-user work checks out its own.
+    report = None
+    async with checkout(owner="pregeneration run") as db:
+        cursor = db.cursor()
+        await cursor.execute("SELECT pg_try_advisory_lock(%s)", (PREGEN_LOCK_KEY,))
+        if not (await cursor.fetchone())[0]:
+            logger.info("Pregeneration already running in another process")
+            return None
+        try:
+            while (run := await _start_or_resume_run(db, resume_only)) is not None:
+                report = await _execute_run(run, concurrency, db)
+            if report is None and not resume_only:
+                logger.info("Pregeneration already completed today")
+        finally:
+            await cursor.execute("SELECT pg_advisory_unlock(%s)", (PREGEN_LOCK_KEY,))
+    return report
+
+# Runs the batch once a night at PREGEN_HOUR (server local time)
+class PregenerationScheduler:
+    def __init__(self, hour: int):
+        self.hour = hour
+        self._task = None
+        self.last_report = None
+
+    async def start(self):
+        if PREGEN_ENABLED:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _loop(self):
+        # A run interrupted by the last shutdown is finished now rather than at PREGEN_HOUR
+        try:
+            self.last_report = await run_pregeneration(resume_only=True)
+        except Exception as e:
+            logger.error(f"Resuming pregeneration run failed: {str(e)}")
+        while True:
+            now = datetime.now()
+            next_run = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            try:
+                self.last_report = await run_pregeneration() or self.last_report
+            except Exception as e:
+                logger.error(f"Pregeneration run failed: {str(e)}")
+
+pregeneration_scheduler = PregenerationScheduler(PREGEN_HOUR)
+
+async def _main():
+    await open_pool()
+    try:
+        async with checkout(owner="pregeneration migrations") as db:
+            await run_migrations(db)
+        print(await run_pregeneration())
+    finally:
+        await close_pool()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
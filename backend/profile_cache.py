@@ -0,0 +1,39 @@
+import os
+from typing import Optional
+from cache import TTLCache
+from models import UserFitnessInput, GymStrength, HomeStrength
+
+# Profiles are read by every generation endpoint and almost never change. Entries are
+# dropped by invalidate_user on every write to Users, and the TTL bounds how stale a
+# profile can get if the row is changed outside the app.
+user_profile_cache = TTLCache(
+    max_size=int(os.getenv("PROFILE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL", "300"))
+)
+
+def get_cached_user(user_id: int) -> Optional[UserFitnessInput]:
+    cached = user_profile_cache.get(user_id)
+    if cached is None:
+        return None
+    # Rebuild fresh objects so callers never share state with the cache
+    return UserFitnessInput(
+        name=cached["name"],
+        age=cached["age"],
+        height_cm=cached["height_cm"],
+        weight_kg=cached["weight_kg"],
+        fat_percentage=cached["fat_percentage"],
+        experience_level=cached["experience_level"],
+        equipment=list(cached["equipment"]),
+        fitness_goal=cached["fitness_goal"],
+        gender=cached["gender"],
+        gym_strength=GymStrength(**cached["gym_strength"]) if cached["gym_strength"] else None,
+        home_strength=HomeStrength(**cached["home_strength"]) if cached["home_strength"] else None
+    )
+
+def cache_user(user_id: int, user_input: UserFitnessInput):
+    profile = user_input.dict()
+    profile["equipment"] = list(profile["equipment"] or [])
+    user_profile_cache.set(user_id, profile)
+
+def invalidate_user(user_id: int):
+    user_profile_cache.invalidate(user_id)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Literal, Optional, Union, List
-from datetime import date
+from typing import Any, Literal, Optional, Union, List
+from datetime import date, datetime
 
 class GymStrengthSchema(BaseModel):
     bench_press_max: float
@@ -74,9 +74,59 @@ class WorkoutResponse(BaseModel):
 class FeedbackResponse(BaseModel):
     message: str
 
+class DayFeedbackResult(BaseModel):
+    day: str
+    status: Literal["saved", "no_workout"]
+    workout_id: Optional[int] = None
+    exercises: int
+
+class BatchFeedbackResponse(BaseModel):
+    message: str
+    results: List[DayFeedbackResult]
+
+GenerationModeField = Literal["reasoning", "structured"]
+
 class NextWorkoutRequest(BaseModel):
     user_id: int
     target_day: str
+    mode: GenerationModeField = "reasoning"
+
+class NextWeekRequest(BaseModel):
+    user_id: int
+    mode: GenerationModeField = "reasoning"
+
+class SavedWorkoutSchema(BaseModel):
+    workout_id: int
+    workout: DailyWorkoutSchema
+
+class NextWeekResponse(BaseModel):
+    workouts: List[SavedWorkoutSchema]
+    message: str
+
+class JobRequest(BaseModel):
+    kind: Literal["current_workout", "next_workout", "nutrition_plan"]
+    user_id: int
+    target_day: Optional[str] = None  # Required for next_workout
+    mode: GenerationModeField = "reasoning"  # Workout jobs only
+
+class JobResponse(BaseModel):
+    job_id: int
+    status: str
+    message: str
+
+class JobStatusResponse(BaseModel):
+    job_id: int
+    kind: str
+    user_id: Optional[int] = None
+    status: Literal["queued", "running", "done", "failed"]
+    progress: int
+    attempts: int
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    updated_at: datetime
+    run_after: datetime  # When a queued job is next eligible to run
 
 
 # Nutrition Schemas
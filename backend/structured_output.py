@@ -0,0 +1,83 @@
+import json
+from typing import Callable, List, Type
+from pydantic import BaseModel, ValidationError
+from models import DailyWorkout, Exercise
+from schemas import DailyWorkoutSchema
+
+# Converts the Pydantic response schemas into the OpenAPI subset Gemini accepts as
+# response_schema, so the model returns bare JSON that validates on arrival.
+
+_TYPES = {"string": "STRING", "integer": "INTEGER", "number": "NUMBER", "boolean": "BOOLEAN", "array": "ARRAY", "object": "OBJECT"}
+
+def _convert(node: dict, defs: dict) -> dict:
+    if "$ref" in node:
+        return _convert(defs[node["$ref"].split("/")[-1]], defs)
+    if "anyOf" in node:
+        options = [option for option in node["anyOf"] if option.get("type") != "null"]
+        nullable = len(options) < len(node["anyOf"])
+        if len(options) == 1:
+            converted = _convert(options[0], defs)
+        else:
+            # Gemini has no unions; e.g. reps (int or "AMRAP") travels as a string
+            labels = [str(option.get("const", option.get("type"))) for option in options]
+            converted = {"type": "STRING", "description": " or ".join(labels)}
+        if nullable:
+            converted["nullable"] = True
+        return converted
+    if "const" in node:
+        return {"type": "STRING", "enum": [str(node["const"])]}
+    if "enum" in node:
+        return {"type": "STRING", "enum": [str(value) for value in node["enum"]]}
+
+    converted = {"type": _TYPES[node["type"]]}
+    if node["type"] == "array":
+        converted["items"] = _convert(node["items"], defs)
+    elif node["type"] == "object":
+        converted["properties"] = {name: _convert(prop, defs) for name, prop in node["properties"].items()}
+        converted["required"] = list(node["properties"])
+    return converted
+
+def gemini_schema(model: Type[BaseModel], as_list: bool = False) -> dict:
+    json_schema = model.model_json_schema()
+    schema = _convert(json_schema, json_schema.get("$defs", {}))
+    return {"type": "ARRAY", "items": schema} if as_list else schema
+
+WEEK_RESPONSE_SCHEMA = gemini_schema(DailyWorkoutSchema, as_list=True)
+DAY_RESPONSE_SCHEMA = gemini_schema(DailyWorkoutSchema)
+
+def structured_config(schema: dict) -> dict:
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+def _normalize(weight: str, name: str, normalize_weight: Callable[[str, str], str]) -> str:
+    try:
+        return normalize_weight(weight, name)
+    except ValueError:
+        # Free-text weights like "light" cannot be rounded, as in json_stream._to_exercise
+        return "N/A"
+
+def _validate_day(data: dict, normalize_weight: Callable[[str, str], str]) -> DailyWorkout:
+    for exercise in data.get("exercises", []):
+        reps = exercise.get("reps")
+        # Reps arrive as strings because of the union above
+        if isinstance(reps, str) and reps.strip().isdigit():
+            exercise["reps"] = int(reps)
+    day = DailyWorkoutSchema.model_validate(data)
+    return DailyWorkout(
+        day=day.day,
+        exercises=[
+            Exercise(name=ex.name, sets=ex.sets, reps=ex.reps, weight=_normalize(ex.weight or "N/A", ex.name, normalize_weight))
+            for ex in day.exercises
+        ]
+    )
+
+def parse_structured_week(text: str, normalize_weight: Callable[[str, str], str]) -> List[DailyWorkout]:
+    try:
+        return [_validate_day(day, normalize_weight) for day in json.loads(text)]
+    except (json.JSONDecodeError, ValidationError, TypeError, AttributeError) as e:
+        raise Exception(f"Structured response failed schema validation: {e}\nRaw response: {text}")
+
+def parse_structured_day(text: str, normalize_weight: Callable[[str, str], str]) -> DailyWorkout:
+    try:
+        return _validate_day(json.loads(text), normalize_weight)
+    except (json.JSONDecodeError, ValidationError, TypeError, AttributeError) as e:
+        raise Exception(f"Structured response failed schema validation: {e}\nRaw response: {text}")
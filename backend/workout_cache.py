@@ -0,0 +1,71 @@
+import os
+from typing import List, Optional
+from cache import TTLCache
+from models import UserFitnessInput, DailyWorkout, Exercise
+from workout_generator import round_to_standard_weight
+
+# Generated weeks depend only on the profile fields in the prompt and the generation
+# mode, so users whose bucketed profiles match can share one generation per mode.
+workout_plan_cache = TTLCache(
+    max_size=int(os.getenv("WORKOUT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("WORKOUT_CACHE_TTL", "86400"))
+)
+
+def _bucket(value, step: float):
+    if value is None:
+        return None
+    if value == 0:
+        # 0 means "never done" in the prompt, keep it distinct from small values
+        return 0
+    return round(value / step) * step or step
+
+def _plate_bucket(max_kg: float) -> float:
+    if not max_kg:
+        return 0
+    # Barbell maxes snap to the same 5kg increments the generated weights use
+    return float(round_to_standard_weight(f"{max_kg}kg", "Barbell").replace("kg", ""))
+
+def workout_plan_key(user_input: UserFitnessInput, mode: str) -> tuple:
+    equipment = tuple(sorted(user_input.equipment or []))
+    is_gym = "barbells" in equipment or "dumbbells" in equipment
+    if is_gym:
+        gym = user_input.gym_strength
+        strength = (
+            "gym",
+            _plate_bucket(gym.bench_press_max) if gym else 0,
+            _plate_bucket(gym.squat_max) if gym else 0,
+            _plate_bucket(gym.deadlift_max) if gym else 0
+        )
+    else:
+        home = user_input.home_strength
+        strength = (
+            "home",
+            _bucket(home.pushups_reps, 5) if home else 0,
+            _bucket(home.pullups_reps, 2) if home else 0,
+            _bucket(home.bodyweight_squats_reps, 5) if home else 0
+        )
+    return (
+        mode,
+        user_input.experience_level,
+        equipment,
+        user_input.fitness_goal,
+        user_input.gender,
+        strength,
+        _bucket(user_input.weight_kg, 5),
+        _bucket(user_input.height_cm, 5),
+        _bucket(user_input.fat_percentage, 5),
+        _bucket(user_input.age, 10)
+    )
+
+def get_cached_week(user_input: UserFitnessInput, mode: str) -> Optional[List[DailyWorkout]]:
+    cached = workout_plan_cache.get(workout_plan_key(user_input, mode))
+    if cached is None:
+        return None
+    # Rebuild fresh objects so callers never share state with the cache
+    return [
+        DailyWorkout(day=workout["day"], exercises=[Exercise(**ex) for ex in workout["exercises"]])
+        for workout in cached
+    ]
+
+def cache_week(user_input: UserFitnessInput, weekly_workouts: List[DailyWorkout], mode: str):
+    workout_plan_cache.set(workout_plan_key(user_input, mode), [workout.dict() for workout in weekly_workouts])
@@ -0,0 +1,313 @@
+import logging
+import os
+from textwrap import dedent
+from typing import Callable, List, Literal, Optional, Tuple
+from models import UserFitnessInput, DailyWorkout, DailyWorkoutFeedback
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the per-call part of a prompt (profile, last week, feedback); the
+# static guidance goes in the system instruction and is not counted against it.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+# Feedback notes are free text, so cap them before they can eat the budget
+MAX_NOTES_CHARS = 200
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+class PromptBudgetExceeded(Exception):
+    pass
+
+def estimate_tokens(text: str) -> int:
+    # Gemini averages about four characters per token for English text
+    return len(text) // 4 + 1
+
+# The static guidance is compiled once at import; only the user context below is
+# built per call. Sending the guidance as the system instruction keeps the start of
+# every request byte-identical, which Gemini can serve from its prefix cache.
+
+_WEIGHT_GUIDANCE = dedent("""
+    Weights (gym exercises): always give numerical weights in kg in standard gym increments:
+    - Barbell exercises (e.g., Barbell Bench Press, Overhead Press): 20kg bar plus plates of 1.25-25kg, total in 5kg increments (45kg, 50kg, 55kg).
+    - Dumbbell exercises (e.g., Incline Dumbbell Press, Dumbbell Flyes, Lateral Raises, Overhead Triceps Extension): 2.5kg increments (10kg, 12.5kg, 15kg).
+    - Cable machine exercises (e.g., Triceps Pushdowns): 2.5kg increments (20kg, 22.5kg, 25kg).
+    If the user has never done a lift (max is 0), start light for their experience level:
+    - Beginner: 10-20% of body weight for compound lifts, 5-10kg for isolation.
+    - Intermediate: 20-40% of body weight for compound lifts, 10-15kg for isolation.
+    - Expert: 40-60% of body weight for compound lifts, 15-25kg for isolation.
+    If the user has a recorded max, use 60-70% of it for compound lifts and 50-60% for isolation exercises.
+    For home-based exercises without equipment, use 'bodyweight' or 'N/A' as appropriate.
+""").strip()
+
+_NEXT_WEEK_WEIGHT_NOTES = dedent("""
+    For exercises done last week, adjust last week's weight numerically based on feedback, in the increments above.
+    For gym exercises, do NOT use 'N/A' or 'bodyweight'; always give a numerical weight in kg.
+""").strip()
+
+_GENDER_GUIDANCE = dedent("""
+    Gender is a secondary factor, after experience level, strength data and equipment:
+    - Male: slightly heavier weights or higher intensity may suit compound lifts.
+    - Female: slightly lighter weights or higher reps for endurance, still with progressive overload.
+    - Other: a balance of the two, unless strength data suggests otherwise.
+""").strip()
+
+_FITNESS_GOAL_GUIDANCE = dedent("""
+    Tailor the workout to the user's fitness goal:
+    - lose_weight: higher reps (12-15), circuit-style workouts, cardio if a treadmill or jump rope is available.
+    - build_muscle: moderate reps (8-12), compound lifts, progressive overload with heavier weights.
+    - stay_fit: balanced strength and cardio, moderate reps (10-12), varied exercises.
+    - improve_endurance: high reps (15-20), shorter rest, cardio-based exercises.
+    - increase_flexibility: mobility and stretching, lighter weights and higher reps for strength work.
+""").strip()
+
+_ADJUSTMENT_GUIDANCE = dedent("""
+    Adjust each exercise based on the user's feedback:
+    - Difficulty 1-2 (too easy) with all prescribed sets and reps completed: increase the weight by one increment (barbell 5kg, dumbbell or cable 2.5kg), or add 1-2 reps.
+    - Difficulty 4-5 (too hard) or prescribed sets/reps not completed: decrease the weight by one increment, or reduce reps by 1-2 or sets by 1.
+    - Difficulty 3 (just right): keep the intensity, with slight progression (e.g., add 1 rep).
+    - Soreness 4-5: reduce intensity for exercises targeting that muscle group.
+    - Notes indicating strain or discomfort (e.g., 'shoulder strain'): reduce intensity for related exercises or substitute a less taxing variation targeting the same muscle group (e.g., Overhead Press -> Dumbbell Lateral Raise).
+    Do not drop exercises unless feedback explicitly calls for a substitution.
+""").strip()
+
+_WEEK_REASONING = dedent("""
+    Before the JSON, reason step by step:
+    1. Use the experience level, equipment, fitness goal and strength data to set each day's intensity.
+    2. Fine-tune weights and reps with the gender guidance.
+    3. Calculate each exercise's weight from the strength data and experience level, following the weight guidance.
+    4. Choose sets and reps from the experience level and fitness goal (beginners fewer sets, experts may use AMRAP).
+    5. Balance the week: upper body push, upper body pull, lower body and core, with rest days.
+    6. Only use exercises possible with the user's available equipment.
+    Give your reasoning per exercise as:
+    - Exercise: [Name]
+      Reasoning: [Your step-by-step thought process]
+    Then return the workout in this JSON format:
+    [
+        {"day": "Monday", "exercises": [{"name": "Exercise Name", "sets": <int>, "reps": <int or "AMRAP">, "weight": "<weight in kg (e.g., '10kg'), 'bodyweight', or 'N/A'>"}, ...]},
+        ...
+        {"day": "Sunday", "exercises": [...]}
+    ]
+""").strip()
+
+_NEXT_WEEK_REASONING = dedent("""
+    Before the JSON, reason step by step:
+    1. Use the profile, last week's plan, last week's workout for the target day and its feedback to decide the adjustments.
+    2. Fine-tune weights and reps with the gender guidance.
+    3. Keep last week's structure (e.g., an Upper Body Push day stays Upper Body Push) unless feedback calls for a major change.
+    4. For each exercise, apply the adjustment guidance to difficulty, sets/reps completed, soreness and notes, and keep the new weight in standard increments.
+    5. Adjust sets and reps from the feedback and experience level.
+    6. Fit the day into the week and avoid overtraining a muscle group that is heavily worked on another day.
+    7. Only use exercises possible with the user's available equipment.
+    Give your reasoning per exercise as:
+    - Exercise: [Name]
+      Reasoning: [Your step-by-step thought process]
+    Then return the workout in this JSON format:
+    {"day": "<target day>", "exercises": [{"name": "Exercise Name", "sets": <int>, "reps": <int or "AMRAP">, "weight": "<weight in kg (e.g., '10kg'), 'bodyweight', or 'N/A'>"}, ...]}
+""").strip()
+
+_NEXT_WEEK_BATCH_REASONING = dedent("""
+    Before the JSON, reason step by step, one target day at a time:
+    1. Use the profile, last week's plan, last week's workout for the day and its feedback to decide the adjustments.
+    2. Fine-tune weights and reps with the gender guidance.
+    3. Keep last week's structure for the day unless feedback calls for a major change.
+    4. For each exercise, apply the adjustment guidance to difficulty, sets/reps completed, soreness and notes, and keep the new weight in standard increments.
+    5. Avoid overtraining a muscle group across the target days and the rest of the week.
+    6. Only use exercises possible with the user's available equipment.
+    Give your reasoning per exercise as:
+    - Exercise: [Name]
+      Reasoning: [Your step-by-step thought process]
+    Then return every target day, and only the target days, in this JSON format:
+    [
+        {"day": "<target day>", "exercises": [{"name": "Exercise Name", "sets": <int>, "reps": <int or "AMRAP">, "weight": "<weight in kg (e.g., '10kg'), 'bodyweight', or 'N/A'>"}, ...]},
+        ...
+    ]
+""").strip()
+
+_STRUCTURED_FORMAT = dedent("""
+    Do not explain your reasoning. Return only JSON matching the response schema.
+    Each exercise's weight must be a numerical weight in kg (e.g., '10kg'), 'bodyweight', or 'N/A'; reps must be an integer or "AMRAP".
+""").strip()
+
+_COMMON_RULES = dedent("""
+    Make the workout appropriate for the user's experience level, equipment, fitness goal, gender and strength data.
+    "AMRAP" (As Many Reps As Possible) may be used for reps, especially for timed efforts.
+    A rest day has an empty exercises list.
+""").strip()
+
+def _system_instruction(task: str, sections: List[str]) -> str:
+    return "\n\n".join([f"You are a fitness trainer AI. {task}"] + sections + [_COMMON_RULES])
+
+_WEEK_TASK = "Generate a full week's workout routine (Monday to Sunday) from the user's profile."
+_NEXT_WEEK_TASK = (
+    "Generate next week's workout for the target day from the user's profile, last week's plan, "
+    "last week's workout for that day and the user's feedback on it."
+)
+
+_NEXT_WEEK_BATCH_TASK = (
+    "Generate next week's workouts for each of the target days from the user's profile, last week's plan, "
+    "last week's workout for each target day and the user's feedback on it."
+)
+
+WEEK_SYSTEM_INSTRUCTIONS = {
+    "reasoning": _system_instruction(_WEEK_TASK, [_WEIGHT_GUIDANCE, _GENDER_GUIDANCE, _FITNESS_GOAL_GUIDANCE, _WEEK_REASONING]),
+    "structured": _system_instruction(_WEEK_TASK, [_WEIGHT_GUIDANCE, _GENDER_GUIDANCE, _FITNESS_GOAL_GUIDANCE, _STRUCTURED_FORMAT]),
+}
+NEXT_WEEK_SYSTEM_INSTRUCTIONS = {
+    "reasoning": _system_instruction(_NEXT_WEEK_TASK, [_ADJUSTMENT_GUIDANCE, _WEIGHT_GUIDANCE, _NEXT_WEEK_WEIGHT_NOTES, _GENDER_GUIDANCE, _FITNESS_GOAL_GUIDANCE, _NEXT_WEEK_REASONING]),
+    "structured": _system_instruction(_NEXT_WEEK_TASK, [_ADJUSTMENT_GUIDANCE, _WEIGHT_GUIDANCE, _NEXT_WEEK_WEIGHT_NOTES, _GENDER_GUIDANCE, _FITNESS_GOAL_GUIDANCE, _STRUCTURED_FORMAT]),
+}
+
+NEXT_WEEK_BATCH_SYSTEM_INSTRUCTIONS = {
+    "reasoning": _system_instruction(_NEXT_WEEK_BATCH_TASK, [_ADJUSTMENT_GUIDANCE, _WEIGHT_GUIDANCE, _NEXT_WEEK_WEIGHT_NOTES, _GENDER_GUIDANCE, _FITNESS_GOAL_GUIDANCE, _NEXT_WEEK_BATCH_REASONING]),
+    "structured": _system_instruction(_NEXT_WEEK_BATCH_TASK, [_ADJUSTMENT_GUIDANCE, _WEIGHT_GUIDANCE, _NEXT_WEEK_WEIGHT_NOTES, _GENDER_GUIDANCE, _FITNESS_GOAL_GUIDANCE, _STRUCTURED_FORMAT]),
+}
+
+class WorkoutPrompt:
+    def __init__(self, system_instruction: str, contents: str):
+        self.system_instruction = system_instruction
+        self.contents = contents
+        self.estimated_tokens = estimate_tokens(contents)
+
+def _profile(user_input: UserFitnessInput) -> str:
+    experience_str = {1: "beginner", 2: "intermediate", 3: "expert"}.get(user_input.experience_level, "beginner")
+    available_equipment = ", ".join(user_input.equipment) if user_input.equipment else "none"
+    lines = [
+        "Profile:",
+        f"name={user_input.name}; age={user_input.age or 'n/a'}; gender={user_input.gender}; "
+        f"height={user_input.height_cm}cm; weight={user_input.weight_kg}kg; "
+        f"body_fat={user_input.fat_percentage if user_input.fat_percentage is not None else 'n/a'}%; "
+        f"experience={experience_str}; goal={user_input.fitness_goal or 'general fitness'}",
+        f"equipment={available_equipment}",
+    ]
+    # Zero means the user has never done the lift/exercise
+    if "barbells" in user_input.equipment or "dumbbells" in user_input.equipment:
+        strength = user_input.gym_strength
+        lines.append(
+            f"maxes: bench={strength.bench_press_max if strength else 0}kg; "
+            f"squat={strength.squat_max if strength else 0}kg; "
+            f"deadlift={strength.deadlift_max if strength else 0}kg (0 = never done)"
+        )
+    else:
+        strength = user_input.home_strength
+        lines.append(
+            f"max reps: pushups={strength.pushups_reps if strength else 0}; "
+            f"pullups={strength.pullups_reps if strength else 0}; "
+            f"bodyweight_squats={strength.bodyweight_squats_reps if strength else 0} (0 = never done)"
+        )
+    return "\n".join(lines)
+
+def _workout_rows(workout: DailyWorkout, normalize_weight: Callable[[str, str], str]) -> List[str]:
+    if not workout.exercises:
+        return [f"{workout.day}|rest|||"]
+    return [
+        f"{workout.day}|{exercise.name}|{exercise.sets}|{exercise.reps}|{normalize_weight(exercise.weight, exercise.name)}"
+        for exercise in workout.exercises
+    ]
+
+def _feedback_rows(feedback: DailyWorkoutFeedback) -> List[str]:
+    rows = []
+    for exercise_feedback in feedback.feedback:
+        notes = (exercise_feedback.notes or "").replace("\n", " ").replace("|", "/")[:MAX_NOTES_CHARS]
+        soreness = exercise_feedback.soreness_level if exercise_feedback.soreness_level is not None else ""
+        rows.append(
+            f"{exercise_feedback.name}|{exercise_feedback.sets_completed}|{exercise_feedback.reps_completed}|"
+            f"{exercise_feedback.difficulty}|{soreness}|{notes}"
+        )
+    return rows
+
+def _day_distance(day: str, target_day: str) -> int:
+    if day not in DAYS or target_day not in DAYS:
+        return len(DAYS)
+    gap = abs(DAYS.index(day) - DAYS.index(target_day))
+    return min(gap, len(DAYS) - gap)
+
+def _check_budget(contents: str, budget: int):
+    if estimate_tokens(contents) > budget:
+        raise PromptBudgetExceeded(f"Prompt context needs ~{estimate_tokens(contents)} tokens, over the budget of {budget}")
+
+def build_week_prompt(user_input: UserFitnessInput, mode: Literal["reasoning", "structured"] = "reasoning", budget: int = PROMPT_TOKEN_BUDGET) -> WorkoutPrompt:
+    contents = _profile(user_input) + "\n\nGenerate the workout for Monday to Sunday."
+    _check_budget(contents, budget)
+    return WorkoutPrompt(WEEK_SYSTEM_INSTRUCTIONS[mode], contents)
+
+def build_next_week_prompt(
+    user_input: UserFitnessInput,
+    feedback: DailyWorkoutFeedback,
+    previous_workout: DailyWorkout,
+    previous_week: List[DailyWorkout],
+    target_day: str,
+    normalize_weight: Callable[[str, str], str],
+    mode: Literal["reasoning", "structured"] = "reasoning",
+    budget: int = PROMPT_TOKEN_BUDGET
+) -> WorkoutPrompt:
+    profile = _profile(user_input)
+    day_and_feedback = "\n\n".join([
+        "\n".join([f"Last week's {target_day} (exercise|sets|reps|weight):"] + [
+            row.split("|", 1)[1] for row in _workout_rows(previous_workout, normalize_weight)
+        ]),
+        "\n".join([f"Feedback on last week's {target_day} (exercise|sets done|reps done|difficulty 1-5|soreness 1-5|notes):"] + _feedback_rows(feedback)),
+        f"Generate the workout for {target_day} of next week."
+    ])
+    contents = profile + "\n\n" + day_and_feedback
+    _check_budget(contents, budget)
+
+    # Last week's other days are context only: the days nearest the target day are
+    # kept and the furthest ones dropped until the prompt fits the budget.
+    other_days = sorted(
+        (workout for workout in previous_week if workout.day != target_day),
+        key=lambda workout: _day_distance(workout.day, target_day)
+    )
+    available = len(other_days)
+    while other_days:
+        ordered = sorted(other_days, key=lambda workout: DAYS.index(workout.day) if workout.day in DAYS else len(DAYS))
+        rows = [row for workout in ordered for row in _workout_rows(workout, normalize_weight)]
+        with_week = "\n\n".join([profile, "\n".join(["Last week's plan (day|exercise|sets|reps|weight):"] + rows), day_and_feedback])
+        if estimate_tokens(with_week) <= budget:
+            contents = with_week
+            break
+        other_days.pop()
+    if len(other_days) < available:
+        logger.info(f"Trimmed last week's context to {len(other_days)} of {available} days to fit the prompt budget of {budget} tokens")
+    return WorkoutPrompt(NEXT_WEEK_SYSTEM_INSTRUCTIONS[mode], contents)
+
+def build_next_week_batch_prompt(
+    user_input: UserFitnessInput,
+    days: List[Tuple[DailyWorkout, DailyWorkoutFeedback]],
+    previous_week: List[DailyWorkout],
+    normalize_weight: Callable[[str, str], str],
+    mode: Literal["reasoning", "structured"] = "reasoning",
+    budget: Optional[int] = None
+) -> WorkoutPrompt:
+    # One prompt for several target days, given as (last week's workout, feedback)
+    # pairs. The profile and last week's plan are sent once instead of once per day,
+    # so the default budget is the per-day budget times the number of days.
+    budget = budget or PROMPT_TOKEN_BUDGET * len(days)
+    target_days = [workout.day for workout, _ in days]
+    profile = _profile(user_input)
+    sections = []
+    for workout, feedback in days:
+        sections.append("\n".join([f"Last week's {workout.day} (exercise|sets|reps|weight):"] + [
+            row.split("|", 1)[1] for row in _workout_rows(workout, normalize_weight)
+        ]))
+        sections.append("\n".join([f"Feedback on last week's {workout.day} (exercise|sets done|reps done|difficulty 1-5|soreness 1-5|notes):"] + _feedback_rows(feedback)))
+    sections.append(f"Generate the workouts for {', '.join(target_days)} of next week.")
+    days_and_feedback = "\n\n".join(sections)
+    contents = profile + "\n\n" + days_and_feedback
+    _check_budget(contents, budget)
+
+    # Last week's other days are context only, trimmed furthest-first as in build_next_week_prompt
+    other_days = sorted(
+        (workout for workout in previous_week if workout.day not in target_days),
+        key=lambda workout: min(_day_distance(workout.day, day) for day in target_days)
+    )
+    available = len(other_days)
+    while other_days:
+        ordered = sorted(other_days, key=lambda workout: DAYS.index(workout.day) if workout.day in DAYS else len(DAYS))
+        rows = [row for workout in ordered for row in _workout_rows(workout, normalize_weight)]
+        with_week = "\n\n".join([profile, "\n".join(["Last week's plan for the other days (day|exercise|sets|reps|weight):"] + rows), days_and_feedback])
+        if estimate_tokens(with_week) <= budget:
+            contents = with_week
+            break
+        other_days.pop()
+    if len(other_days) < available:
+        logger.info(f"Trimmed last week's context to {len(other_days)} of {available} days to fit the prompt budget of {budget} tokens")
+    return WorkoutPrompt(NEXT_WEEK_BATCH_SYSTEM_INSTRUCTIONS[mode], contents)